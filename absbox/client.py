@@ -1,27 +1,43 @@
-import json, urllib3, getpass, enum, os, pickle
+import json, urllib3, getpass, enum, os, pickle, asyncio, functools, time, gzip, hashlib, threading, collections, itertools, weakref
 from importlib.metadata import version
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from json.decoder import JSONDecodeError
 from dataclasses import dataclass
+from contextlib import contextmanager
 from datetime import datetime
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, ReadTimeout
 import pandas as pd
 from rich.console import Console
 from schema import Schema
 import toolz as tz
 from lenses import lens
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
-from absbox.validation import isValidUrl, vStr
+from absbox.validation import isValidUrl, vStr, getValidationMode, setValidationMode
 from absbox.local.util import mkTag,mapValsBy \
                               , _read_cf, _read_asset_pricing, mergeStrWithDict \
                               , earlyReturnNone, searchByFst, filter_by_tags \
-                              , enumVals, lmap, inferPoolTypeFromAst, getValWithKs, mapNone
+                              , enumVals, lmap, inferPoolTypeFromAst, getValWithKs, mapNone, estimatePoolWork
 from absbox.local.component import mkPool, mkAssumpType, mkNonPerfAssumps, mkLiqMethod \
-                                   , mkAssetUnion, mkRateAssumption, mkDatePattern, mkPoolType
+                                   , mkAssetUnion, mkRateAssumption, mkDatePattern, mkPoolType, mkColumnarPool
 
 from absbox.local.base import ValidationMsg
+from absbox.local.cache import ResultCache, TeeReader
+from absbox.local.resilience import RetryPolicy, CircuitBreaker, TimeoutModel
+from absbox.local.instrument import Profiler, profiled, phase, note, carry, timed
+from absbox.local.store import ResultStore
+from absbox.local.jsonstream import JsonBody
 from absbox.local.china import SPV
 from absbox.local.generic import Generic
 
@@ -30,7 +46,7 @@ VERSION_NUM = version("absbox")
 urllib3.disable_warnings()
 console = Console()
 
-__all__ = ["API", "Endpoints", "RunReqType", "RunResp", "MsgColor", "LibraryEndpoints","EnginePath"]
+__all__ = ["API", "AsyncAPI", "ClusterAPI", "Endpoints", "RunReqType", "RunResp", "MsgColor", "LibraryEndpoints","EnginePath","ResultCache","RetryPolicy","TimeoutModel","Profiler","ResultStore"]
 
 
 class Endpoints(str, enum.Enum):
@@ -51,6 +67,8 @@ class Endpoints(str, enum.Enum):
     """Run multiple deals endpoint"""
     RunDate = "runDate"
     """Run Dates from a datepattern """
+    RegisterDeal = "registerDeal"
+    """Register a deal on engine server, which can be referred by hash in following runs"""
     Version = "version"
     """Get version of engine server endpoint"""
 
@@ -139,35 +157,133 @@ class AbsboxError(Exception):
         super().__init__(errorMsg)
 
 
-def PickApiFrom(Apilist:list,**kwargs):
-    """ Auto init API instance from a list of API urls with version check
+class CircuitOpenError(ConnectionError):
+    """Exception for an endpoint skipped by circuit breaker after consecutive failures"""
+
+
+class UnknownDealRef(AbsboxError):
+    """Exception for a deal hash not registered on engine server"""
+    def __init__(self, url) -> None:
+        super().__init__(f"Deal hash is not registered on engine server:{url}")
+
+
+def pingApi(url, timeout=5) -> dict | tuple:
+    """ get version info from engine server, return ("Error", e) if failed
+
+    :meta private:
+    """
+    try:
+        r = requests.get(f"{url}/{Endpoints.Version.value}", verify=False, timeout=timeout ,headers={"Origin":"http://localhost:8001"}).text 
+        return json.loads(r) 
+    except Exception as e:
+        return ("Error",e)
+
+
+def rankApis(Apilist:list, timeout=5) -> tuple:
+    """ ping API urls concurrently and return those matching current lib version, ranked by round trip latency
 
+    :meta private:
     :param Apilist: list of API urls
     :type Apilist: list
+    :param timeout: timeout in seconds of each ping, defaults to 5
+    :type timeout: int, optional
+    :return: (ranked valid apis, all ping responses)
+    :rtype: tuple
     """
-    def pingApi(x):
-        try:
-            r = requests.get(f"{x.value}/{Endpoints.Version.value}", verify=False, timeout=5 ,headers={"Origin":"http://localhost:8001"}).text 
-            return json.loads(r) 
-        except Exception as e:
-            return ("Error",e)
-
     _,libVersion,_ = VERSION_NUM.split(".")
-    
-    apiResps = [{"url":api,"resp":pingApi(api)} for api in Apilist ]
+
+    def ping(api) -> dict:
+        started = time.perf_counter()
+        resp = pingApi(api.value if isinstance(api, enum.Enum) else api, timeout)
+        return {"url":api, "resp":resp, "latency":time.perf_counter()-started}
+
+    with ThreadPoolExecutor(max_workers=max(len(Apilist), 1)) as executor:
+        apiResps = list(executor.map(ping, Apilist))
     validApis = tz.pipe(apiResps
                     ,lambda apis: list(filter(lambda x:"Error" not in x['resp'],apis))
                     ,lambda apis: lens.Each()['resp']['_version'].modify(lambda x: x.split("."))(apis)
                     ,lambda apis: filter(lambda x:x['resp']['_version'][1]==libVersion, apis) 
-                    ,lambda apis: sorted(apis,key=lambda x: x['resp']['_version'][2])
+                    ,lambda apis: sorted(apis,key=lambda x: x['latency'])
     )
-
     r = list(validApis)
-
-    if len(r)>0: 
-        return API(r[0],**kwargs)
-    else:
+    if len(r)==0:
         raise AbsboxError(f"❌{MsgColor.Error.value}No valid API found in list match current lib version {libVersion}, from list:{apiResps}")
+    return r, apiResps
+
+
+def PickApiFrom(Apilist:list,**kwargs):
+    """ Auto init API instance from a list of API urls with version check, connect to the one with lowest latency.
+    the others are kept as `fallbacks` of API ranked by latency, followed by `fallbacks` passed in `kwargs`
+
+    :param Apilist: list of API urls
+    :type Apilist: list
+    """
+    r, _ = rankApis(Apilist)
+    urls = [x['url'].value if isinstance(x['url'], enum.Enum) else x['url'] for x in r]
+    extra = [u.value if isinstance(u, enum.Enum) else u for u in (kwargs.pop("fallbacks", None) or [])]
+    api = API(urls[0], fallbacks=list(tz.unique(urls + extra, key=lambda u: isValidUrl(u).rstrip("/")))[1:], **kwargs)
+    for x, u in zip(r, urls):
+        api.health[isValidUrl(u).rstrip("/")] |= {"latency": x['latency'], "capabilities": x['resp'].get("_capabilities", [])}
+    return api
+
+
+def estimateDealWork(deal) -> int:
+    """ estimate projection work of a deal from its pool, at least 1
+
+    :meta private:
+    """
+    return max(1, estimatePoolWork(getattr(deal, "pool", None) or getattr(deal, "资产池", None)))
+
+
+def wireDeal(_deal: dict, columnar: bool = False, encodePool=mkColumnarPool) -> dict:
+    """ deal json to be sent, with pool assets in columns by `encodePool` if `columnar`
+
+    :meta private:
+    """
+    match _deal:
+        case {"contents": {"pool": pool}} if columnar:
+            return _deal | {"contents": _deal["contents"] | {"pool": encodePool(pool)}}
+        case _:
+            return _deal
+
+
+def dumpDeal(deal, columnar=False) -> str:
+    """ translate a deal and dump it to json text, picklable so it can run in worker processes
+
+    :meta private:
+    """
+    return json.dumps(wireDeal(deal.json if hasattr(deal, "json") else deal, columnar), ensure_ascii=False)
+
+
+def mkMultiDealReq(dealTexts: dict, poolAssump, nonPerfAssump) -> str:
+    """ assemble request of multiple deals from deal json texts
+
+    :meta private:
+    """
+    dump = lambda x: json.dumps(x, ensure_ascii=False)
+    mDeal = ", ".join(f"{dump(str(k))}: {v}" for k, v in dealTexts.items())
+    return f'{{"tag": {dump(RunReqType.MultiStructs.value)}, "contents": [{{{mDeal}}}, {dump(poolAssump)}, {dump(nonPerfAssump)}]}}'
+
+
+def storeResults(store: ResultStore, result: dict, readFn) -> ResultStore:
+    """ read raw results one by one into `store`, raw result is released once saved
+
+    :meta private:
+    """
+    for k in list(result.keys()):
+        store.put(k, readFn(k, result.pop(k)))
+    return store
+
+
+def printScenarioWarnings(result: dict) -> None:
+    """ print validation messages from a multi-scenario run response
+
+    :meta private:
+    """
+    rawWarnMsgByScen = {k: [f"{MsgColor.Warning.value}{_['contents']}" for _ in filter_by_tags(v[RunResp.LogResp.value], enumVals(ValidationMsg))] for k, v in result.items()}
+    rawWarnMsg = list(tz.concat(rawWarnMsgByScen.values()))
+    if len(rawWarnMsg)>0:
+        console.print("Warning Message from server:\n"+"\n".join(rawWarnMsg))
 
 
 @dataclass
@@ -185,6 +301,26 @@ class API:
 
     check: bool = True
     """ flag to ensure version match between client and server """
+    compress: str = None
+    """ compress request body with 'gzip' or 'zstd' if server supports it, defaults to None """
+    compressThreshold: int = 1024*1024
+    """ min size in bytes of request body to be compressed, defaults to 1MB """
+    cache: ResultCache = None
+    """ cache of run responses on local disk, defaults to None """
+    dealRef: bool = False
+    """ register deal on engine server once and send its hash in following runs, if server supports 'registerDeal', defaults to False """
+    fallbacks: list = None
+    """ urls of other engine servers to fail over when `url` can't be connected, defaults to None """
+    retry: RetryPolicy = None
+    """ retry, circuit breaker and hedging policy of requests to engine server, defaults to None (no retry) """
+    timeoutModel: TimeoutModel = None
+    """ model of run timeout learned from observed latency, defaults to `TimeoutModel()` """
+    profiler: Profiler = None
+    """ collect timing of each run, defaults to None """
+    columnar: bool = True
+    """ send pool assets in columns if server supports 'columnarPool', defaults to True """
+    chunkedUpload: int = 1024*1024
+    """ size in bytes of chunks to send request body while it is serialized if server supports 'chunkedUpload', a smaller body is sent in one piece, None to turn off, defaults to 1MB """
     server_info = {}
     """ internal """
     version = VERSION_NUM.split(".")
@@ -231,6 +367,322 @@ class API:
         console.print(f"✅{MsgColor.Success.value}Connected, local lib:{'.'.join(self.version)}, server:{'.'.join(engine_version)}")
         self.session = requests.Session()
 
+        self._lock = threading.Lock()
+        self.fallbacks = [isValidUrl(u.value if isinstance(u, enum.Enum) else u).rstrip("/") for u in (self.fallbacks or [])]
+        self.health = {u: {"latency": None, "failures": 0, "capabilities": None} for u in [self.url]+self.fallbacks}
+        """ ping latency in seconds and count of connection failures by server url """
+        self._breakers = {}
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=200))
+        self._hedgeExecutor = None
+        if self.timeoutModel is None:
+            self.timeoutModel = TimeoutModel()
+        self._negotiate()
+
+    def _negotiate(self) -> None:
+        """ turn on features of requests by `_capabilities` of connected server, called once connected or switched to another server
+
+        :meta private:
+        """
+        self._encoding = None
+        match self.compress:
+            case None:
+                pass
+            case "gzip" | "zstd" if not self.supports(self.compress):
+                console.print(f"{MsgColor.Warning.value}Server doesn't accept {self.compress} request, send request without compression")
+            case "zstd" if zstandard is None:
+                raise AbsboxError(f"❌{MsgColor.Error.value}Package `zstandard` is required for zstd compression, pls install by: pip install zstandard")
+            case "gzip" | "zstd":
+                self._encoding = self.compress
+            case _:
+                raise AbsboxError(f"❌{MsgColor.Error.value}Invalid compress:{self.compress}, only support 'gzip' or 'zstd'")
+        if self.dealRef and not self.supports("registerDeal"):
+            console.print(f"{MsgColor.Warning.value}Server doesn't support deal registration, send full deal in each run")
+        self._columnar = self.columnar and self.supports("columnarPool")
+        self._wireDeals = {}
+        self._wirePools = {}
+        self._dealHashes = {}
+        self._registered = set()
+        self._chunked = self.chunkedUpload if self.chunkedUpload and self.supports("chunkedUpload") else None
+
+    def _failover(self, failedUrl: str) -> bool:
+        """ switch to the healthy fallback server with lowest latency, return False if none available
+
+        :meta private:
+        """
+        with self._lock:
+            if self.url != failedUrl:
+                return True
+            self.health[failedUrl]["failures"] += 1
+            ranked = sorted(self.health, key=lambda u: (self.health[u]["failures"], self.health[u]["latency"] or float("inf")))
+            for u in ranked:
+                if u == failedUrl or self.health[u]["failures"] > 0:
+                    continue
+                resp = pingApi(u)
+                if "Error" in resp or (self.check and resp['_version'].split(".")[1] != self.version[1]):
+                    self.health[u]["failures"] += 1
+                    continue
+                console.print(f"{MsgColor.Warning.value}Failed to connect {failedUrl}, switch to engine server -> {u}")
+                self.health[u]["capabilities"] = resp.get("_capabilities", [])
+                self.url = u
+                self.server_info = resp
+                self._negotiate()
+                return True
+            return False
+
+    def _breaker(self, _url: str) -> CircuitBreaker:
+        """ circuit breaker of an endpoint url
+
+        :meta private:
+        """
+        with self._lock:
+            if _url not in self._breakers:
+                self._breakers[_url] = CircuitBreaker(self.retry.breakerThreshold, self.retry.breakerCooldown)
+            return self._breakers[_url]
+
+    def _capabilities(self, u: str) -> set:
+        """ features declared by server `u`, from its version info fetched once
+
+        :meta private:
+        """
+        if self.health[u]["capabilities"] is None:
+            resp = pingApi(u)
+            self.health[u]["capabilities"] = [] if "Error" in resp else resp.get("_capabilities", [])
+        return set(self.health[u]["capabilities"])
+
+    def _hedgeUrl(self, _url: str, needs: set) -> str | None:
+        """ url of same endpoint on the healthy fallback server with lowest latency, which supports features `needs` used by request body
+
+        :meta private:
+        """
+        if not _url.startswith(self.url):
+            return None
+        ranked = sorted((u for u in self.health if u != self.url and self.health[u]["failures"] == 0)
+                        , key=lambda u: self.health[u]["latency"] or float("inf"))
+        return next((u+_url[len(self.url):] for u in ranked if needs <= self._capabilities(u)), None)
+
+    def _post_hedged(self, _url: str, hedgeUrl: str, threshold: float, **kwargs):
+        """ post request and send a duplicate to `hedgeUrl` if no response after `threshold` seconds, return first success
+
+        :meta private:
+        """
+        if self._hedgeExecutor is None:
+            self._hedgeExecutor = ThreadPoolExecutor(thread_name_prefix="absbox-hedge")
+        post = lambda u: self.session.post(u, verify=False, **kwargs)
+        pending = {self._hedgeExecutor.submit(post, _url)}
+        done, _ = wait(pending, timeout=threshold)
+        if not done:
+            pending.add(self._hedgeExecutor.submit(post, hedgeUrl))
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [f for f in done if f.exception() is None and f.result().status_code == 200]
+            if succeeded or not pending:
+                winner = (succeeded or list(done))[0]
+                for f in pending | (done - {winner}):
+                    f.add_done_callback(lambda x: x.exception() is None and x.result().close())
+                return winner.result()
+
+    def _post(self, _url: str, body: bytes, hdrs: dict, timeout, stream: bool, needs: set = None):
+        """ post request to engine server, with retries/circuit breaker/hedging of `retry` policy.
+        request is hedged only to a server supporting features `needs` used by the body, None if it can't be sent to another server
+
+        :meta private:
+        """
+        if self.session is None:
+            raise AbsboxError(f"❌: None type for session")
+        kwargs = {"data": body, "headers": hdrs, "timeout": timeout, "stream": stream}
+        if self.retry is None or not _url.startswith(self.url):
+            return self.session.post(_url, verify=False, **kwargs)
+
+        policy = self.retry
+        breaker = self._breaker(_url)
+        latencies = self._latencies[_url[len(self.url):]]
+        for attempt in range(policy.retries+1):
+            if attempt > 0:
+                time.sleep(policy.delay(attempt-1))
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit of {_url} is open after {breaker.failures} failures")
+            hedgeUrl = self._hedgeUrl(_url, needs) if needs is not None and policy.hedgePercentile and not stream and len(latencies) >= policy.hedgeMinSamples else None
+            started = time.perf_counter()
+            try:
+                if hedgeUrl:
+                    threshold = sorted(latencies)[int(policy.hedgePercentile*(len(latencies)-1))]
+                    r = self._post_hedged(_url, hedgeUrl, threshold, **kwargs)
+                else:
+                    r = self.session.post(_url, verify=False, **kwargs)
+            except (ConnectionError, ReadTimeout):
+                breaker.failure()
+                if attempt == policy.retries:
+                    raise
+                continue
+            if r.status_code in policy.retryStatus:
+                breaker.failure()
+                if attempt == policy.retries:
+                    return r
+                r.close()
+                continue
+            breaker.success()
+            latencies.append(time.perf_counter()-started)
+            return r
+
+    @contextmanager
+    def profile(self, sink=None):
+        """ collect timing of runs within the block
+
+        .. code-block:: python
+
+            with api.profile() as p:
+                api.run(deal, poolAssump=a)
+            p.toDataFrame()
+
+        :param sink: function called with each record, defaults to None
+        :type sink: callable, optional
+        :return: a profiler holding records of runs
+        :rtype: Profiler
+        """
+        prev = self.profiler
+        self.profiler = Profiler(sink)
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = prev
+
+    def supports(self, feature: str) -> bool:
+        """ check if engine server declares a feature in `_capabilities` of its version info
+
+        :param feature: name of feature, e.g 'gzip', 'zstd'
+        :type feature: str
+        :return: True if server supports the feature
+        :rtype: bool
+        """
+        return feature in self.server_info.get("_capabilities", [])
+
+    def _encode_body(self, _req: str, _url: str) -> tuple:
+        """ encode request text to bytes, compressed if it is larger than `compressThreshold` and sent to engine server
+
+        :meta private:
+        :return: (request body, extra headers)
+        :rtype: tuple
+        """
+        if isinstance(_req, JsonBody):
+            with phase("serialize"):
+                head = _req.head(max(_req.chunkSize, self.compressThreshold if self._encoding else 0))
+            if head is None:
+                encoding = self._encoding if _url.startswith(self.url) else None
+                return (_req.encoded(encoding), {"Content-Encoding": encoding} if encoding else {})
+            _req = head.decode('utf-8')
+        body = _req.encode('utf-8')
+        if self._encoding is None or len(body) < self.compressThreshold or not _url.startswith(self.url):
+            return (body, {})
+        match self._encoding:
+            case "gzip":
+                return (gzip.compress(body, compresslevel=6), {"Content-Encoding": "gzip"})
+            case "zstd":
+                return (zstandard.ZstdCompressor().compress(body), {"Content-Encoding": "zstd"})
+
+    def _dumpReq(self, r) -> str | JsonBody:
+        """ request text, or a :class:`JsonBody` serialized while it is sent if server accepts chunked upload
+
+        :meta private:
+        """
+        if self._chunked:
+            return JsonBody(r, self._chunked)
+        return json.dumps(r, ensure_ascii=False)
+
+    def _wireDeal(self, deal) -> dict:
+        """ deal json to be sent to engine server, remembered for recently used deals
+
+        :meta private:
+        """
+        _deal = deal.json if hasattr(deal, "json") else deal
+        if not self._columnar:
+            return _deal
+        (d, w) = self._wireDeals.get(id(_deal), (None, None))
+        if d is _deal:
+            return w
+        w = wireDeal(_deal, True, self._columnarPool)
+        if w is _deal:
+            return w
+        if len(self._wireDeals) >= 64:
+            self._wireDeals.pop(next(iter(self._wireDeals)))
+        self._wireDeals[id(_deal)] = (_deal, w)
+        return w
+
+    def _columnarPool(self, pool: dict) -> dict:
+        """ pool json with assets in columns, remembered for recently used pools, i.e a pool shared by variants of a deal
+
+        :meta private:
+        """
+        (p, c) = self._wirePools.get(id(pool), (None, None))
+        if p is pool:
+            return c
+        c = mkColumnarPool(pool)
+        if len(self._wirePools) >= 16:
+            self._wirePools.pop(next(iter(self._wirePools)))
+        self._wirePools[id(pool)] = (pool, c)
+        return c
+
+    def _hashDeal(self, deal) -> tuple:
+        """ hash of deal json text, remembered for recently used deals
+
+        :meta private:
+        :return: (hash, deal json text or None if hash is remembered)
+        :rtype: tuple
+        """
+        _deal = self._wireDeal(deal)
+        if id(_deal) in self._dealHashes:
+            (d, h) = self._dealHashes[id(_deal)]
+            if d is _deal:
+                return (h, None)
+        text = json.dumps(_deal, ensure_ascii=False)
+        h = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        if len(self._dealHashes) >= 64:
+            self._dealHashes.pop(next(iter(self._dealHashes)))
+        self._dealHashes[id(_deal)] = (_deal, h)
+        return (h, text)
+
+    def registerDeal(self, deal, force=False, timeout=None) -> str:
+        """ upload a deal to engine server, runs with `dealRef` send the hash instead of the deal
+
+        :param deal: a deal object
+        :type deal: Generic | SPV
+        :param force: upload even if the deal was registered before, defaults to False
+        :type force: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel` from size of deal)
+        :type timeout: float, optional
+        :return: sha256 hash of deal json text
+        :rtype: str
+        """
+        if not self.supports("registerDeal"):
+            raise AbsboxError(f"❌{MsgColor.Error.value}Server doesn't support deal registration")
+        (h, text) = self._hashDeal(deal)
+        if h in self._registered and not force:
+            return h
+        if text is None:
+            text = json.dumps(self._wireDeal(deal), ensure_ascii=False)
+        r = self._send_req(text, f"{self.url}/{Endpoints.RegisterDeal.value}", timeout=timeout, work=estimateDealWork(deal))
+        if r is None or r.get('hash') != h:
+            raise AbsboxError(f"❌{MsgColor.Error.value}Failed to register deal, local hash:{h}, server response:{r}")
+        self._registered.add(h)
+        return h
+
+    def _send_deal_req(self, deal, mkReq, _url: str, **kwargs):
+        """ send a run request built by `mkReq`, with deal replaced by its hash if `dealRef` is on.
+        the deal is registered again if server doesn't know the hash, i.e server restarted
+
+        :meta private:
+        """
+        if not (self.dealRef and self.supports("registerDeal")) or not hasattr(deal, "json"):
+            return self._send_req(lambda: mkReq(deal), _url, **kwargs)
+        # hash is taken again after switching to a server with other capabilities
+        mkRefReq = lambda: mkReq(mkTag(("DealRef", self._hashDeal(deal)[0])))
+        register = lambda: self.registerDeal(deal)
+        try:
+            return self._send_req(mkRefReq, _url, dealRef=register, **kwargs)
+        except UnknownDealRef:
+            console.print(f"{MsgColor.Warning.value}Deal is not found on server, register it again")
+            self.registerDeal(deal, force=True)
+            return self._send_req(mkRefReq, _url, dealRef=register, **kwargs)
+
     def build_run_deal_req(self, run_type: str, deal, perfAssump=None, nonPerfAssump=[]) -> str:
         """build run deal requests: (single run, multi-scenario run, multi-struct run) 2
         
@@ -244,30 +696,32 @@ class API:
         :param nonPerfAssump: a list of deal level assumptions, defaults to []
         :type nonPerfAssump: list, optional
         :raises RuntimeError: _description_
-        :return: a string of request body to be sent out to engine
-        :rtype: str
+        :return: request body to be sent out to engine, a :class:`JsonBody` if server accepts chunked upload
+        :rtype: str | JsonBody
 
         """
         r = None
         _nonPerfAssump = mkNonPerfAssumps({}, nonPerfAssump)
 
-        match Schema(str).validate(run_type):
-            case "Single" | "S":
-                _deal = deal.json if hasattr(deal, "json") else deal
-                _perfAssump = earlyReturnNone(mkAssumpType, perfAssump)
-                r = mkTag((RunReqType.Single.value, [_deal, _perfAssump, _nonPerfAssump]))
-            case "MultiScenarios" | "MS":
-                _deal = deal.json if hasattr(deal, "json") else deal
-                mAssump = mapValsBy(perfAssump, mkAssumpType)
-                r = mkTag((RunReqType.MultiScenarios.value, [_deal, mAssump, _nonPerfAssump]))
-            case "MultiStructs" | "MD" :
-                mDeal = {k: v.json if hasattr(v, "json") else v for k, v in deal.items()}
-                _perfAssump = mkAssumpType(perfAssump)
-                r = mkTag((RunReqType.MultiStructs.value, [mDeal, _perfAssump, _nonPerfAssump]))
-            case _:
-                raise RuntimeError(f"Failed to match run type:{run_type}")
+        with phase("build"):
+            match Schema(str).validate(run_type):
+                case "Single" | "S":
+                    _deal = self._wireDeal(deal)
+                    _perfAssump = earlyReturnNone(mkAssumpType, perfAssump)
+                    r = mkTag((RunReqType.Single.value, [_deal, _perfAssump, _nonPerfAssump]))
+                case "MultiScenarios" | "MS":
+                    _deal = self._wireDeal(deal)
+                    mAssump = mapValsBy(perfAssump, mkAssumpType)
+                    r = mkTag((RunReqType.MultiScenarios.value, [_deal, mAssump, _nonPerfAssump]))
+                case "MultiStructs" | "MD" :
+                    mDeal = {k: self._wireDeal(v) for k, v in deal.items()}
+                    _perfAssump = mkAssumpType(perfAssump)
+                    r = mkTag((RunReqType.MultiStructs.value, [mDeal, _perfAssump, _nonPerfAssump]))
+                case _:
+                    raise RuntimeError(f"Failed to match run type:{run_type}")
         try:
-            return json.dumps(r, ensure_ascii=False)
+            with phase("serialize"):
+                return self._dumpReq(r)
         except TypeError as e:
             raise AbsboxError(f"❌Failed to convert request to json:{e}")
 
@@ -282,8 +736,8 @@ class API:
         :param rateAssumps: a list of rate assumptions
         :type rateAssumps: _type_
         :raises RuntimeError: _description_
-        :return: a string of request body to be sent out to engine
-        :rtype: str
+        :return: request body to be sent out to engine, a :class:`JsonBody` if server accepts chunked upload
+        :rtype: str | JsonBody
 
         """
         r = None
@@ -295,23 +749,28 @@ class API:
             assetTag = inferPoolTypeFromAst(p) if (('assets' in p) or ('清单' in p)) else "UPool"
             _p = tz.dissoc(p, 'cutoffDate')
             if assetTag == "UPool":
-                return mkTag((assetTag, mkPoolType(assetDate, _p, True)))
+                return mkTag((assetTag, mkPoolType(assetDate, _p, True, self._columnar)))
             else:
-                return mkTag((assetTag, mkPoolType(assetDate, _p, False)))
+                return mkTag((assetTag, mkPoolType(assetDate, _p, False, self._columnar)))
 
-        if not isMultiScenario:
-            r = mkTag((RunReqType.SinglePool.value, [buildPoolType(pool), mkAssumpType(poolAssump), _rateAssump]))
-        else:
-            r = mkTag((RunReqType.MultiPoolScenarios.value, [buildPoolType(pool), mapValsBy(poolAssump, mkAssumpType), _rateAssump]))
+        with phase("build"):
+            if not isMultiScenario:
+                r = mkTag((RunReqType.SinglePool.value, [buildPoolType(pool), mkAssumpType(poolAssump), _rateAssump]))
+            else:
+                r = mkTag((RunReqType.MultiPoolScenarios.value, [buildPoolType(pool), mapValsBy(poolAssump, mkAssumpType), _rateAssump]))
 
-        return json.dumps(r, ensure_ascii=False)
+        with phase("serialize"):
+            return self._dumpReq(r)
 
+    @profiled
     def run(self, deal,
             poolAssump=None,
             runAssump=[],
             read=True,
             showWarning=True,
-            debug=False) -> dict :
+            debug=False,
+            useCache=True,
+            timeout=None) -> dict :
         """ run deal with pool and deal run assumptions
 
         :param deal: a deal object
@@ -326,6 +785,10 @@ class API:
         :type showWarning: bool, optional
         :param debug: return request text instead of sending out such request, defaults to False
         :type debug: bool, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel` from size of pool)
+        :type timeout: float, optional
         :return: result of run, a dict of dataframe if `read` is True.
         :rtype: dict
 
@@ -340,14 +803,15 @@ class API:
 
         # construct request
         runType = "Single"
-        req = self.build_run_deal_req(runType, deal, poolAssump, runAssump)
+        mkReq = lambda d: self.build_run_deal_req(runType, d, poolAssump, runAssump)
         if debug:
-            return req
+            return str(mkReq(deal))
         # branching with pricing
-        if runAssump is None or searchByFst(runAssump, "pricing") is None:
-            result = self._send_req(req, url)
-        else:
-            result = self._send_req(req, url, timeout=30)
+        work = estimateDealWork(deal)
+        pricing = runAssump is not None and searchByFst(runAssump, "pricing") is not None
+        if pricing:
+            work *= self.timeoutModel.pricingFactor
+        result = self._send_deal_req(deal, mkReq, url, timeout=timeout, work=work, useCache=useCache, pricing=pricing)
 
         if result is None or 'error' in result:
             raise AbsboxError(f"❌{MsgColor.Error.value}Failed to get response from run")
@@ -357,16 +821,22 @@ class API:
             console.print("Warning Message from server:\n"+"\n".join(list(rawWarnMsg)))
 
         if read:
-            return deal.read(result)
+            with phase("read"):
+                return deal.read(result)
         else:
             return result
 
+    @profiled
     def runByScenarios(self, deal,
                     poolAssump=None,
                     runAssump=[],
                     read=True,
                     showWarning=True,
-                    debug=False) -> dict :
+                    debug=False,
+                    stream=False,
+                    useCache=True,
+                    timeout=None,
+                    store=None) -> dict :
         """ run deal with multiple scenarios, return a map
 
         :param deal: _description_
@@ -381,36 +851,161 @@ class API:
         :type showWarning: bool, optional
         :param debug: return request text instead of sending out such request, defaults to False
         :type debug: bool, optional
+        :param stream: decode response scenario by scenario, raw response of a scenario is released once it is read, defaults to False
+        :type stream: bool, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel` from size of pool and number of scenarios)
+        :type timeout: float, optional
+        :param store: save result of each scenario to disk once it is read and return the store instead of a dict, response is streamed if `ijson` is installed, defaults to None
+        :type store: ResultStore, optional
         :return: a dict with scenario names as keys
         :rtype: dict        
         """
 
         url = f"{self.url}/{Endpoints.RunDealByScnearios.value}"
         runType = "MultiScenarios"
-        req = self.build_run_deal_req(runType, deal, poolAssump, runAssump)
+        mkReq = lambda d: self.build_run_deal_req(runType, d, poolAssump, runAssump)
 
         if debug:
-            return req
+            return str(mkReq(deal))
+
+        note(scenarios=len(poolAssump or {}))
+        work = estimateDealWork(deal) * max(1, len(poolAssump or {}))
+        pricing = runAssump is not None and searchByFst(runAssump, "pricing") is not None
+        if pricing:
+            work *= self.timeoutModel.pricingFactor
+
+        if stream or (store is not None and ijson is not None):
+            result = {} if store is None else store
+            for k, v in self._send_deal_req(deal, mkReq, url, timeout=timeout, work=work, stream=True, useCache=useCache, pricing=pricing):
+                if k == 'error':
+                    raise AbsboxError(f"❌{MsgColor.Error.value}Failed to get response from run:{v}")
+                if showWarning:
+                    printScenarioWarnings({k: v})
+                with phase("read"):
+                    if store is None:
+                        result[k] = deal.read(v) if read else v
+                    else:
+                        store.put(k, deal.read(v) if read else v)
+            return result
 
-        if runAssump is None or searchByFst(runAssump, "pricing") is None:
-            result = self._send_req(req, url)
-        else:
-            result = self._send_req(req, url, timeout=30)
+        result = self._send_deal_req(deal, mkReq, url, timeout=timeout, work=work, useCache=useCache, pricing=pricing)
 
         if result is None or 'error' in result:
             raise AbsboxError(f"❌{MsgColor.Error.value}Failed to get response from run")
 
-        rawWarnMsgByScen = {k: [f"{MsgColor.Warning.value}{_['contents']}" for _ in filter_by_tags(v[RunResp.LogResp.value], enumVals(ValidationMsg))] for k, v in result.items()}
-        rawWarnMsg = list(tz.concat(rawWarnMsgByScen.values()))
-        
-        if showWarning and len(rawWarnMsg)>0:
-            console.print("Warning Message from server:\n"+"\n".join(rawWarnMsg))
+        if showWarning:
+            printScenarioWarnings(result)
+
+        if store is not None:
+            with phase("read"):
+                return storeResults(store, result, lambda k, v: deal.read(v) if read else v)
 
         if read:
-            return tz.valmap(deal.read, result)
+            with phase("read"):
+                return tz.valmap(deal.read, result)
         else:
             return result
 
+    def _iterBatches(self, names: list, runBatch, batchSize: int, workers: int):
+        """ run scenario names in batches, yield (name, result) of each batch once it completes
+
+        :meta private:
+        """
+        if batchSize < 1:
+            raise AbsboxError(f"❌{MsgColor.Error.value}Invalid batchSize:{batchSize}, should be a positive integer")
+        batches = (list(b) for b in tz.partition_all(batchSize, names))
+        if workers <= 1:
+            for b in batches:
+                yield from runBatch(b).items()
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="absbox-batch") as executor:
+            pending = {executor.submit(carry(runBatch), b) for b in itertools.islice(batches, workers)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        pending |= {executor.submit(carry(runBatch), b) for b in itertools.islice(batches, 1)}
+                        yield from f.result().items()
+            finally:
+                for f in pending:
+                    f.cancel()
+
+    def iterByScenarios(self, deal,
+                        poolAssump=None,
+                        runAssump=[],
+                        read=True,
+                        showWarning=True,
+                        batchSize=10,
+                        workers=1,
+                        useCache=True,
+                        timeout=None):
+        """ run deal with multiple scenarios in batches, yield (scenario name, result) as each batch completes
+
+        only results of batches in flight are kept in memory
+
+        .. code-block:: python
+
+            for name, r in api.iterByScenarios(deal, poolAssump=scenarios, batchSize=20, workers=4):
+                summary[name] = r['bonds']['A1'].cash.sum()
+
+        :param deal: a deal object
+        :type deal: Generic | SPV
+        :param poolAssump: a map of pool assumptions, with scenario names as keys
+        :type poolAssump: dict
+        :param runAssump: deal level assumption, defaults to []
+        :type runAssump: list, optional
+        :param read: if read response into dataframe, defaults to True
+        :type read: bool, optional
+        :param showWarning: if show warning messages from server, defaults to True
+        :type showWarning: bool, optional
+        :param batchSize: number of scenarios in a request, defaults to 10
+        :type batchSize: int, optional
+        :param workers: number of batches in flight, defaults to 1
+        :type workers: int, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds of each batch, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
+        :return: an iterator of (scenario name, result), in order of completion if `workers` > 1
+        :rtype: iterator
+        """
+        if not isinstance(poolAssump, dict):
+            raise AbsboxError(f"❌{MsgColor.Error.value} poolAssump should be a dict but got {type(poolAssump)}")
+        # blocking run of `API`, as `AsyncAPI` overrides runs with awaitable ones
+        runBatch = lambda names: API.runByScenarios(self, deal, {k: poolAssump[k] for k in names}, runAssump, read=read
+                                                     , showWarning=showWarning, useCache=useCache, timeout=timeout)
+        return self._iterBatches(list(poolAssump.keys()), runBatch, batchSize, workers)
+
+    def iterPoolByScenarios(self, pool, poolAssump, rateAssump=None, read=True, batchSize=10, workers=1, useCache=True, timeout=None):
+        """ run a pool with multiple scenarios in batches, yield (scenario name, result) as each batch completes
+
+        :param pool: pool map
+        :type pool: dict
+        :param poolAssump: assumption map
+        :type poolAssump: dict
+        :param rateAssump: interest rate assumptions, defaults to None
+        :type rateAssump: list, optional
+        :param read: if read response into dataframe, defaults to True
+        :type read: bool, optional
+        :param batchSize: number of scenarios in a request, defaults to 10
+        :type batchSize: int, optional
+        :param workers: number of batches in flight, defaults to 1
+        :type workers: int, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds of each batch, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
+        :return: an iterator of (scenario name, result), in order of completion if `workers` > 1
+        :rtype: iterator
+        """
+        if not isinstance(poolAssump, dict):
+            raise AbsboxError(f"❌{MsgColor.Error.value} poolAssump should be a dict but got {type(poolAssump)}")
+        runBatch = lambda names: API.runPoolByScenarios(self, pool, {k: poolAssump[k] for k in names}, rateAssump, read=read
+                                                         , useCache=useCache, timeout=timeout)
+        return self._iterBatches(list(poolAssump.keys()), runBatch, batchSize, workers)
+
     def read_single(self, pool_resp) -> tuple:
         """ read pool run response from engine and convert to dataframe
 
@@ -424,7 +1019,8 @@ class API:
         return (result, pool_bals)
 
 
-    def runPoolByScenarios(self, pool, poolAssump, rateAssump=None, read=True, debug=False) -> dict :
+    @profiled
+    def runPoolByScenarios(self, pool, poolAssump, rateAssump=None, read=True, debug=False, stream=False, useCache=True, timeout=None) -> dict :
         """ run a pool with multiple scenario ,return result as map , with key same to pool assumption map
 
         :param pool: pool map
@@ -437,23 +1033,40 @@ class API:
         :type read: bool, optional
         :param debug: return request text instead of sending out such request, defaults to False
         :type debug: bool, optional
+        :param stream: decode response scenario by scenario, raw response of a scenario is released once it is read, defaults to False
+        :type stream: bool, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
         :return: a dict with scenario names as keys
         :rtype: dict
         """
 
         url = f"{self.url}/{Endpoints.RunPoolByScenarios.value}"
-        req = self.build_pool_req(pool, poolAssump, rateAssump, isMultiScenario=True)
+        mkReq = lambda: self.build_pool_req(pool, poolAssump, rateAssump, isMultiScenario=True)
 
         if debug:
-            return req
+            return str(mkReq())
+
+        note(scenarios=len(poolAssump))
+        work = max(1, estimatePoolWork(pool)) * max(1, len(poolAssump))
+        if stream:
+            result = {}
+            for k, v in self._send_req(mkReq, url, timeout=timeout, stream=True, useCache=useCache, work=work):
+                with phase("read"):
+                    result[k] = (v & lens.Values().modify(self.read_single)) if read else v
+            return result
 
-        result = self._send_req(req, url)
+        result = self._send_req(mkReq, url, timeout=timeout, useCache=useCache, work=work)
 
         if read:
-            return result & lens.Values().Values().modify(self.read_single)
+            with phase("read"):
+                return result & lens.Values().Values().modify(self.read_single)
         return result
 
-    def runPool(self, pool, poolAssump=None, rateAssump=None, read=True, debug=False) -> tuple:
+    @profiled
+    def runPool(self, pool, poolAssump=None, rateAssump=None, read=True, debug=False, useCache=True, timeout=None) -> tuple:
         """perform pool run with pool and rate assumptions
 
         :param pool: a pool object
@@ -466,6 +1079,10 @@ class API:
         :type read: bool, optional
         :param debug: return request text instead of sending out such request, defaults to False
         :type debug: bool, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
         :return: tuple of cashflow and pool statistics
         :rtype: tuple
         """
@@ -475,21 +1092,26 @@ class API:
 
         url = f"{self.url}/{Endpoints.RunPool.value}"
 
-        req = self.build_pool_req(pool, poolAssump, rateAssump, isMultiScenario=False)
+        mkReq = lambda: self.build_pool_req(pool, poolAssump, rateAssump, isMultiScenario=False)
 
         if debug:
-            return req
+            return str(mkReq())
 
-        result = self._send_req(req, url)
+        result = self._send_req(mkReq, url, timeout=timeout, useCache=useCache, work=max(1, estimatePoolWork(pool)))
 
         if read:
-            return result & lens.Values().modify(self.read_single)
+            with phase("read"):
+                return result & lens.Values().modify(self.read_single)
         else:
             return result
 
-    def runStructs(self, deals, poolAssump=None, nonPoolAssump=None, runAssump=None, read=True, debug=False) -> dict:
+    @profiled
+    def runStructs(self, deals, poolAssump=None, nonPoolAssump=None, runAssump=None, read=True, debug=False
+                   , chunkSize=None, workers=None, retries=1, useCache=True, timeout=None, store=None) -> dict:
         """run multiple deals with same assumption
 
+        deals can be sent in chunks, each chunk is a separate request and a failed chunk will be retried on its own
+
         :param deals: a dict of deals
         :type deals: dict
         :param poolAssump: _description_, defaults to None
@@ -500,8 +1122,20 @@ class API:
         :type runAssump: _type_, optional
         :param read: _description_, defaults to True
         :type read: bool, optional
-        :param debug: return request text instead of sending out such request, defaults to False
+        :param debug: return request text instead of sending out such request, a list of request texts if `chunkSize` is set, defaults to False
         :type debug: bool, optional
+        :param chunkSize: max number of deals in a single request, defaults to None (all deals in one request)
+        :type chunkSize: int, optional
+        :param workers: number of processes to translate deals and number of chunks in flight, defaults to None (translate and send in current thread)
+        :type workers: int, optional
+        :param retries: times to retry a failed chunk, defaults to 1
+        :type retries: int, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds of each request, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
+        :param store: save result of each deal to disk once it is read and return the store instead of a dict, response of a chunk is parsed in full before saving, defaults to None
+        :type store: ResultStore, optional
         :return: a map of results
         :rtype: dict
         """
@@ -510,22 +1144,57 @@ class API:
         url = f"{self.url}/{Endpoints.RunMultiDeal.value}" 
         _poolAssump = mkAssumpType(poolAssump) if poolAssump else None 
         _nonPerfAssump = mkNonPerfAssumps({}, mapNone(nonPoolAssump,[]) + mapNone(runAssump,[]))
-        req = json.dumps(mkTag(("MultiDealRunReq"
-                                 ,[ tz.valmap(lambda x:x.json, deals)
-                                   ,_poolAssump
-                                   ,_nonPerfAssump]))
-                         ,ensure_ascii=False)
 
-        if debug:
-            return req
-        result = self._send_req(req, url)
+        note(deals=len(deals))
+        with phase("build"):
+            if workers and workers > 1:
+                with ProcessPoolExecutor(max_workers=workers, initializer=setValidationMode, initargs=(getValidationMode(),)) as executor:
+                    dealTexts = dict(zip(deals.keys(), executor.map(functools.partial(dumpDeal, columnar=self._columnar), deals.values(), chunksize=max(1, len(deals)//(workers*4)))))
+            else:
+                dealTexts = tz.valmap(functools.partial(dumpDeal, columnar=self._columnar), deals)
+
+        works = tz.valmap(estimateDealWork, deals)
+        columnar = self._columnar
+        # deals are dumped again if switched to a server with different capabilities
+        mkReqOf = lambda ks, req: lambda: req if self._columnar == columnar else \
+            mkMultiDealReq({k: dumpDeal(deals[k], self._columnar) for k in ks}, _poolAssump, _nonPerfAssump)
+        if chunkSize is None:
+            with phase("serialize"):
+                req = mkMultiDealReq(dealTexts, _poolAssump, _nonPerfAssump)
+            if debug:
+                return req
+            result = self._send_req(mkReqOf(list(deals.keys()), req), url, timeout=timeout, useCache=useCache, work=sum(works.values()))
+        else:
+            chunks = list(tz.partition_all(chunkSize, dealTexts.keys()))
+            with phase("serialize"):
+                reqs = [mkMultiDealReq({k: dealTexts[k] for k in ks}, _poolAssump, _nonPerfAssump) for ks in chunks]
+            if debug:
+                return reqs
+
+            def sendChunk(req, ks):
+                for i in range(retries+1):
+                    try:
+                        return self._send_req(mkReqOf(ks, req), url, timeout=timeout, useCache=useCache, work=sum(works[k] for k in ks))
+                    except (AbsboxError, EngineError) as e:
+                        console.print(f"{MsgColor.Warning.value}Failed to run a chunk of deals, attempt {i+1}/{retries+1}:{e}")
+                raise AbsboxError(f"❌{MsgColor.Error.value}Failed to run deals {list(ks)} after {retries} retries")
+
+            with ThreadPoolExecutor(max_workers=workers or 1) as executor:
+                result = tz.merge(executor.map(carry(sendChunk), reqs, chunks))
+
+        if store is not None:
+            with phase("read"):
+                return storeResults(store, result, lambda k, v: deals[k].read(v) if read else v)
+
         if read:
-            return {k: deals[k].read(v) for k, v in result.items()}    
+            with phase("read"):
+                return {k: deals[k].read(v) for k, v in result.items()}    
         else:
             return result
 
+    @profiled
     def runAsset(self, date, _assets, poolAssump=None, rateAssump=None
-                 , pricing=None, read=True, debug=False) -> tuple:
+                 , pricing=None, read=True, debug=False, useCache=True, timeout=None) -> tuple:
         """run asset with assumptions
 
         :param date: date of start projection and pricing day
@@ -542,6 +1211,10 @@ class API:
         :type read: bool, optional
         :param debug: return request text instead of sending out such request, defaults to False
         :type debug: bool, optional
+        :param useCache: look up and save response in `cache` of API, defaults to True
+        :type useCache: bool, optional
+        :param timeout: timeout in seconds, defaults to None (estimated by `timeoutModel`)
+        :type timeout: float, optional
         :return: (cashflow, balance, pricing result)
         :rtype: tuple
         """
@@ -561,15 +1234,19 @@ class API:
         _assumptions = mkAssumpType(poolAssump) if poolAssump else None
         _rate = lmap(mkRateAssumption, rateAssump) if rateAssump else None
         _pricing = mkLiqMethod(pricing) if pricing else None
-        assets = lmap(mkAssetUnion, _assets) 
-        req = json.dumps([date, assets, _assumptions, _rate, _pricing]
-                         , ensure_ascii=False)
+        with phase("build"):
+            assets = lmap(mkAssetUnion, _assets) 
+        with phase("serialize"):
+            req = json.dumps([date, assets, _assumptions, _rate, _pricing]
+                             , ensure_ascii=False)
         if debug:
             return req
         
-        result = self._send_req(req, url)
+        work = max(1, estimatePoolWork({"assets": _assets})) * (self.timeoutModel.pricingFactor if pricing else 1)
+        result = self._send_req(req, url, timeout=timeout, useCache=useCache, work=work)
         if read:
-            return readResult(result)
+            with phase("read"):
+                return readResult(result)
         else:
             return result
 
@@ -698,7 +1375,7 @@ class API:
         runType = p.get("runType", "S")
         prod_flag = {"production": p.get("production", True)}
 
-        runReq = mergeStrWithDict(self.build_run_deal_req(runType, _id, poolAssump, dealAssump), prod_flag)
+        runReq = mergeStrWithDict(str(self.build_run_deal_req(runType, _id, poolAssump, dealAssump)), prod_flag)
         if not hasattr(self, "token"):
             raise AbsboxError(f"❌{MsgColor.Error.value} No token found, please call loginLibrary() to login")
         
@@ -766,35 +1443,382 @@ class API:
             return pickle.loads(r.content)
 
 
-    def _send_req(self, _req, _url: str, timeout=10, headers={})-> dict | None:
+    def _iter_items(self, r, cacheKey=None):
+        """ decode top level items of a json object response one at a time
+
+        :meta private:
+        :param r: a response opened in stream mode
+        :type r: requests.Response
+        :param cacheKey: save response to `cache` with the key once fully decoded, defaults to None
+        :type cacheKey: str, optional
+        :return: an iterator of (key, value)
+        :rtype: iterator
+        """
+        with r:
+            r.raw.decode_content = True
+            sink = self.cache.writer() if cacheKey else None
+            completed = False
+            try:
+                yield from timed(ijson.kvitems(TeeReader(r.raw, sink) if sink else r.raw, '', use_float=True), "decode")
+                completed = True
+                note(responseBytes=r.raw.tell())
+            except ijson.JSONError as e:
+                raise AbsboxError(f"❌ Failed to decode response from server:{e}")
+            finally:
+                if sink:
+                    sink.close()
+                    if completed:
+                        self.cache.commit(cacheKey, sink.name)
+                    else:
+                        os.remove(sink.name)
+
+    def _iter_cached_items(self, f):
+        """ decode top level items of a cached response file one at a time
+
+        :meta private:
+        """
+        with open(f, 'rb') as fh:
+            yield from timed(ijson.kvitems(fh, '', use_float=True), "decode")
+
+    def _send_req(self, _req, _url: str, timeout=10, headers={}, stream=False, useCache=False, work=None, pricing=False, dealRef=None)-> dict | None:
         """common function send request to server
 
         :meta private:
-        :param _req: request body
-        :type _req: string
+        :param _req: request body, or a function building it which is called again after switching to a fallback server
+        :type _req: str | JsonBody | callable
         :param _url: engine server url
         :type _url: str
-        :param timeout: timeout in seconds, defaults to 10
+        :param timeout: timeout in seconds, None to estimate by `timeoutModel` with `work`, defaults to 10
         :type timeout: int, optional
         :param headers: default request header, defaults to {}
         :type headers: dict, optional
+        :param stream: return an iterator of (key, value) of response object instead of a dict, defaults to False
+        :type stream: bool, optional
+        :param useCache: look up and save response in `cache` if request is sent to engine server, defaults to False
+        :type useCache: bool, optional
+        :param work: estimated work of request, observed latency of request is fed to `timeoutModel`, defaults to None
+        :type work: float, optional
+        :param pricing: a run with pricing, timeout estimated is at least `pricingMinTimeout` of `timeoutModel`, defaults to False
+        :type pricing: bool, optional
+        :param dealRef: function registering the deal referred by request, called if response is not found in `cache`, request is not hedged to another server, defaults to None
+        :type dealRef: callable, optional
         :return: response in dict
         :rtype: dict | None
         """
+        if stream and ijson is None:
+            raise AbsboxError(f"❌{MsgColor.Error.value}Package `ijson` is required for streaming response, pls install by: pip install ijson")
+        cacheKey = None
+        baseUrl = self.url
+        mkReq = _req if callable(_req) else None
+        if mkReq is not None:
+            _req = mkReq()
+        if useCache and self.cache is not None and _url.startswith(self.url):
+            cacheKey = self.cache.key(self.server_info.get('_version', ''), _url[len(self.url):], _req)
+            cachedFile = self.cache.lookup(cacheKey)
+            if cachedFile is not None:
+                note(endpoint=_url[len(self.url):], cached=True)
+                if stream:
+                    return self._iter_cached_items(cachedFile)
+                with open(cachedFile, 'r', encoding='utf-8') as fh, phase("decode"):
+                    return json.load(fh)
         try:
-            hdrs = self.hdrs | headers
-            r = None
-            if self.session:
-                r = self.session.post(_url, data=_req.encode('utf-8'), headers=hdrs, verify=False, timeout=timeout)
-            else:
-                raise AbsboxError(f"❌: None type for session")
+            if dealRef is not None:
+                dealRef()
+            try:
+                body, encodingHdrs = self._encode_body(_req, _url)
+            except TypeError as e:
+                raise AbsboxError(f"❌Failed to convert request to json:{e}")
+            hdrs = self.hdrs | encodingHdrs | headers
+            endpoint = _url[len(baseUrl):] if _url.startswith(baseUrl) else _url
+            if timeout is None:
+                timeout = self.timeoutModel.timeout(endpoint, work or 0, len(body) if isinstance(body, bytes) else body.estimate(), pricing)
+            note(endpoint=endpoint)
+            started = time.perf_counter()
+            # features of server used by body, a streamed body can't be sent twice
+            needs = None if dealRef is not None or not isinstance(body, bytes) else \
+                set(encodingHdrs.values()) | ({"columnarPool"} if self._columnar else set())
+            with phase("transfer"):
+                r = self._post(_url, body, hdrs, timeout, stream, needs)
+            note(requestBytes=len(body) if isinstance(body, bytes) else body.size)
+            if work and r.status_code == 200:
+                self.timeoutModel.observe(endpoint, work, time.perf_counter()-started)
         except (ConnectionRefusedError, ConnectionError):
+            if _url.startswith(baseUrl) and self.fallbacks and self._failover(baseUrl):
+                return self._send_req(mkReq or _req, self.url+_url[len(baseUrl):], timeout, headers, stream, useCache, work, pricing, dealRef)
             raise AbsboxError(f"❌ Failed to talk to server {_url}")
         except ReadTimeout:
-            raise AbsboxError(f"❌ Failed to get response from server")
+            raise AbsboxError(f"❌ Failed to get response from server in {timeout:.1f} seconds")
+        if r.status_code == 410 and dealRef is not None:
+            raise UnknownDealRef(_url)
         if r.status_code != 200:
             raise EngineError(r)
+        if stream:
+            return self._iter_items(r, cacheKey)
+        note(responseBytes=r.raw.tell() or len(r.content))
         try:
-            return json.loads(r.text)
+            with phase("decode"):
+                result = json.loads(r.text)
         except JSONDecodeError as e:
             raise EngineError(e)
+        if cacheKey and not (isinstance(result, dict) and 'error' in result):
+            self.cache.put(cacheKey, r.text)
+        return result
+
+
+@dataclass
+class AsyncAPI(API):
+    """ Asyncio flavor of :class:`API`, every run method is awaitable
+
+    Version handshake is performed once when the client is created, runs are bounded by a semaphore of size `concurrency`
+
+    .. code-block:: python
+
+        async with AsyncAPI(EnginePath.LOCAL, concurrency=64) as api:
+            rs = await asyncio.gather(*[api.run(d, poolAssump=a) for a in assumps])
+
+    :return: AsyncAPI instance
+    :rtype: AsyncAPI
+    """
+
+    concurrency: int = 16
+    """ max number of runs in flight against the engine """
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.concurrency < 1:
+            raise AbsboxError(f"❌{MsgColor.Error.value}Invalid concurrency:{self.concurrency}, should be a positive integer")
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="absbox")
+        self._limiters = weakref.WeakKeyDictionary()
+
+    def _limiter(self) -> asyncio.Semaphore:
+        """ semaphore of current event loop
+
+        :meta private:
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._limiters:
+                # a semaphore waited on refers to its loop, which is then kept alive by the value, so closed loops are dropped here
+                for closed in [l for l in self._limiters if l.is_closed()]:
+                    del self._limiters[closed]
+                self._limiters[loop] = asyncio.Semaphore(self.concurrency)
+            return self._limiters[loop]
+
+    async def _submit(self, fn, *args, **kwargs):
+        """ run a blocking call of `API` in worker thread, bounded by semaphore
+
+        :meta private:
+        """
+        async with self._limiter():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, carry(functools.partial(fn, self, *args, **kwargs)))
+
+    async def run(self, *args, **kwargs) -> dict:
+        """ awaitable version of :meth:`API.run` """
+        return await self._submit(API.run, *args, **kwargs)
+
+    async def runByScenarios(self, *args, **kwargs) -> dict:
+        """ awaitable version of :meth:`API.runByScenarios` """
+        return await self._submit(API.runByScenarios, *args, **kwargs)
+
+    async def runPool(self, *args, **kwargs) -> tuple:
+        """ awaitable version of :meth:`API.runPool` """
+        return await self._submit(API.runPool, *args, **kwargs)
+
+    async def runPoolByScenarios(self, *args, **kwargs) -> dict:
+        """ awaitable version of :meth:`API.runPoolByScenarios` """
+        return await self._submit(API.runPoolByScenarios, *args, **kwargs)
+
+    async def runStructs(self, *args, **kwargs) -> dict:
+        """ awaitable version of :meth:`API.runStructs` """
+        return await self._submit(API.runStructs, *args, **kwargs)
+
+    async def runAsset(self, *args, **kwargs) -> tuple:
+        """ awaitable version of :meth:`API.runAsset` """
+        return await self._submit(API.runAsset, *args, **kwargs)
+
+    async def runDates(self, *args, **kwargs):
+        """ awaitable version of :meth:`API.runDates` """
+        return await self._submit(API.runDates, *args, **kwargs)
+
+    def close(self) -> None:
+        """ shutdown worker threads and http session """
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class ClusterAPI:
+    """ Spread a multi-scenario run across multiple engine servers
+
+    Scenarios are split into chunks and dispatched to all servers matching lib version,
+    the share of each server is weighted by its observed latency per scenario.
+
+    .. code-block:: python
+
+        capi = ClusterAPI([EnginePath.NY_PROD, EnginePath.LDN_PROD], lang="english")
+        rs = capi.runByScenarios(deal, poolAssump={"base": .., "stress": ..})
+
+    :return: ClusterAPI instance
+    :rtype: ClusterAPI
+    """
+
+    urls: list
+    """ candidate urls of engine servers """
+    lang: str = "chinese"
+    """ language of response from server, defaults to 'chinese' """
+    check: bool = True
+    """ flag to ensure version match between client and server """
+    compress: str = None
+    """ compress request body with 'gzip' or 'zstd' if server supports it, defaults to None """
+    chunkSize: int = 50
+    """ max number of scenarios in a single request """
+    decay: float = 0.3
+    """ weight of latest observation in the moving average of latency """
+
+    def __post_init__(self) -> None:
+        ranked, _ = rankApis(self.urls)
+        self.apis = []
+        for r in ranked:
+            try:
+                self.apis.append(API(r['url'], lang=self.lang, check=self.check, compress=self.compress))
+            except (AbsboxError, VersionMismatch) as e:
+                console.print(f"{MsgColor.Warning.value}Skip engine server {r['url']}:{e}")
+        if len(self.apis) == 0:
+            raise AbsboxError(f"❌{MsgColor.Error.value}No engine server available from list:{self.urls}")
+        self.latency = {api.url: None for api in self.apis}
+        """ moving average of seconds per scenario by server url """
+
+    def _weights(self) -> dict:
+        """ share of scenarios by server url, servers without observation are assumed to be average
+
+        :meta private:
+        """
+        observed = [v for v in self.latency.values() if v]
+        avgLatency = sum(observed)/len(observed) if observed else 1.0
+        speeds = {u: 1/(v or avgLatency) for u, v in self.latency.items()}
+        total = sum(speeds.values())
+        return {u: s/total for u, s in speeds.items()}
+
+    def _allocate(self, names: list) -> dict:
+        """ split scenario names into chunks by server url
+
+        :meta private:
+        """
+        weights = self._weights()
+        quotas = {u: int(len(names)*w) for u, w in weights.items()}
+        remainders = sorted(weights, key=lambda u: len(names)*weights[u]-quotas[u], reverse=True)
+        for u in remainders[:len(names)-sum(quotas.values())]:
+            quotas[u] += 1
+
+        r = {}
+        start = 0
+        for u, q in quotas.items():
+            if q > 0:
+                r[u] = [list(c) for c in tz.partition_all(self.chunkSize, names[start:start+q])]
+            start += q
+        return r
+
+    def _observe(self, url: str, elapsed: float, n: int) -> None:
+        """ update moving average of latency per scenario
+
+        :meta private:
+        """
+        perScenario = elapsed/n
+        prev = self.latency[url]
+        self.latency[url] = perScenario if prev is None else self.decay*perScenario + (1-self.decay)*prev
+
+    def _runChunks(self, api, deal, chunks, poolAssump, runAssump) -> tuple:
+        """ run chunks sequentially on one server, return (merged result, failed chunks)
+
+        :meta private:
+        """
+        r = {}
+        failed = []
+        for chunk in chunks:
+            started = time.perf_counter()
+            try:
+                r |= api.runByScenarios(deal, {k: poolAssump[k] for k in chunk}, runAssump, read=False, showWarning=False)
+                self._observe(api.url, time.perf_counter()-started, len(chunk))
+            except (AbsboxError, EngineError) as e:
+                console.print(f"{MsgColor.Warning.value}Failed to run {len(chunk)} scenarios on {api.url}:{e}")
+                failed.append(chunk)
+        return r, failed
+
+    def runByScenarios(self, deal,
+                       poolAssump=None,
+                       runAssump=[],
+                       read=True,
+                       showWarning=True,
+                       debug=False) -> dict:
+        """ run deal with multiple scenarios across servers, return a map same as :meth:`API.runByScenarios`
+
+        a chunk failed on one server will be re-run on a server without failure
+
+        :param deal: a deal object
+        :type deal: Generic | SPV
+        :param poolAssump: a map of pool assumptions, with scenario names as keys
+        :type poolAssump: dict
+        :param runAssump: deal level assumption, defaults to []
+        :type runAssump: list, optional
+        :param read: if read response into dataframe, defaults to True
+        :type read: bool, optional
+        :param showWarning: if show warning messages from server, defaults to True
+        :type showWarning: bool, optional
+        :param debug: return request texts by server url instead of sending out requests, defaults to False
+        :type debug: bool, optional
+        :return: a dict with scenario names as keys
+        :rtype: dict
+        """
+        if not isinstance(poolAssump, dict):
+            raise AbsboxError(f"❌{MsgColor.Error.value} poolAssump should be a dict but got {type(poolAssump)}")
+
+        if hasattr(deal, "json"):
+            # translate once before chunks are sent concurrently, the deal object is passed on so work of each chunk is estimated from its pool
+            deal.json
+        apis = {api.url: api for api in self.apis}
+        plan = self._allocate(list(poolAssump.keys()))
+
+        if debug:
+            return {u: [str(apis[u].build_run_deal_req("MultiScenarios", deal, {k: poolAssump[k] for k in c}, runAssump)) for c in cs]
+                    for u, cs in plan.items()}
+
+        merged = {}
+        failed = []
+        healthy = []
+        with ThreadPoolExecutor(max_workers=len(plan)) as executor:
+            futures = {u: executor.submit(carry(self._runChunks), apis[u], deal, cs, poolAssump, runAssump) for u, cs in plan.items()}
+            for u, f in futures.items():
+                r, fs = f.result()
+                merged |= r
+                failed += fs
+                if not fs:
+                    healthy.append(u)
+
+        if failed:
+            if not healthy:
+                raise AbsboxError(f"❌{MsgColor.Error.value}Failed to run {sum(map(len, failed))} scenarios on all servers")
+            for i, chunk in enumerate(failed):
+                r, fs = self._runChunks(apis[healthy[i % len(healthy)]], deal, [chunk], poolAssump, runAssump)
+                if fs:
+                    raise AbsboxError(f"❌{MsgColor.Error.value}Failed to run scenarios {chunk} after retry")
+                merged |= r
+
+        result = {k: merged[k] for k in poolAssump.keys()}
+
+        if showWarning:
+            printScenarioWarnings(result)
+
+        if read:
+            return tz.valmap(deal.read, result)
+        else:
+            return result
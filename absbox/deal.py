@@ -78,16 +78,17 @@ def mkDeal(x:dict, preCheck=True):
 
 def mkDealsBy(d, m: dict)->dict:
     "Input a deal, permunations, lenses ,and return a list of deals with variety"
-    return {k: dataclasses.replace(d, **v) for k, v in m.items()} 
+    return {k: shareParts(dataclasses.replace(d, **v), d) for k, v in m.items()} 
 
 
 def setDealsBy(d, *receipes: list, init=None, **kwargs):
     "input a deal object, a list of tweaks( path, values) ,return an updated deal"
     if init:
         receipes = [(init & _[0], _[1]) for _ in receipes]
+    base = d
     for (p, v) in receipes:
         d &= p.set(v)
-    return d
+    return shareParts(d, base)
 
 
 def prodDealsBy(d, *receipes, **kwargs) -> dict:
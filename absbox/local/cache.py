@@ -0,0 +1,138 @@
+import os, hashlib, threading, tempfile
+from dataclasses import dataclass
+
+
+@dataclass
+class ResultCache:
+    """ Content addressed cache of raw engine responses on local disk
+
+    Entries are keyed by hash of request text and engine version, least recently used entries are evicted once total size exceeds `maxSize`
+
+    .. code-block:: python
+
+        api = API(EnginePath.LOCAL, cache=ResultCache("~/.absbox/cache"))
+        api.run(deal, poolAssump=p)   # sent to engine
+        api.run(deal, poolAssump=p)   # read from disk
+        api.cache.stats()
+
+    """
+    path: str
+    """ folder to keep cached responses """
+    maxSize: int = 1024**3
+    """ max total size of cached responses in bytes, defaults to 1GB """
+
+    def __post_init__(self) -> None:
+        self.path = os.path.expanduser(self.path)
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """ build a cache key from request parts, e.g (engine version, endpoint, request text), a part can be an iterable of utf-8 byte chunks """
+        h = hashlib.sha256()
+        for p in parts:
+            if isinstance(p, str):
+                h.update(p.encode('utf-8'))
+            else:
+                for chunk in p:
+                    h.update(chunk)
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _file(self, k: str) -> str:
+        return os.path.join(self.path, f"{k}.json")
+
+    def lookup(self, k: str) -> str | None:
+        """ return path of cached response file and mark it as recently used, None if not found """
+        f = self._file(k)
+        with self._lock:
+            try:
+                os.utime(f)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return f
+
+    def get(self, k: str) -> str | None:
+        """ return cached response text, None if not found """
+        f = self.lookup(k)
+        if f is None:
+            return None
+        try:
+            with open(f, 'r', encoding='utf-8') as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def writer(self):
+        """ open a temp file in cache folder, to be committed by :meth:`commit` once fully written """
+        return tempfile.NamedTemporaryFile(mode='wb', dir=self.path, suffix=".tmp", delete=False)
+
+    def commit(self, k: str, tmpFile: str) -> None:
+        """ move a fully written temp file into cache as entry `k` """
+        os.replace(tmpFile, self._file(k))
+        self.evict()
+
+    def put(self, k: str, text: str) -> None:
+        """ save response text as entry `k` """
+        with self.writer() as fh:
+            fh.write(text.encode('utf-8'))
+        self.commit(k, fh.name)
+
+    def _entries(self) -> list:
+        r = []
+        for e in os.scandir(self.path):
+            if e.name.endswith(".json"):
+                try:
+                    st = e.stat()
+                    r.append((st.st_mtime, st.st_size, e.path))
+                except FileNotFoundError:
+                    continue
+        return r
+
+    def evict(self) -> None:
+        """ remove least recently used entries until total size is within `maxSize` """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(_[1] for _ in entries)
+            for (_, size, f) in entries:
+                if total <= self.maxSize:
+                    break
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self) -> dict:
+        """ hit/miss statistics and disk usage of cache """
+        entries = self._entries()
+        total = self.hits + self.misses
+        return {"hits": self.hits
+                , "misses": self.misses
+                , "hitRate": self.hits/total if total else None
+                , "entries": len(entries)
+                , "size": sum(_[1] for _ in entries)}
+
+    def clear(self) -> None:
+        """ remove all cached responses and reset statistics """
+        with self._lock:
+            for (_, _, f) in self._entries():
+                os.remove(f)
+            self.hits = 0
+            self.misses = 0
+
+
+class TeeReader:
+    """ file-like wrapper copying every chunk read from `src` into `sink` """
+    def __init__(self, src, sink) -> None:
+        self.src = src
+        self.sink = sink
+
+    def read(self, n=-1) -> bytes:
+        data = self.src.read(n)
+        self.sink.write(data)
+        return data
@@ -47,35 +47,44 @@ class SPV:
     自定义: dict = None
     科目: dict = None
 
-    @property
+    def __setattr__(self, name, value):
+        self.__dict__.pop("json", None)
+        object.__setattr__(self, name, value)
+
+    def invalidate(self) -> None:
+        """ drop cached json and field translations after mutating a field in place, e.g `deal.资产池['清单'].append(..)` """
+        self.__dict__.pop("json", None)
+        dealParts(self).clear()
+
+    @functools.cached_property
     def json(self):
-        parsedDates = mkDate(self.日期)
-        defaultStartDate = self.日期.get("起息日", None) or self.日期['归集日'][0]
-        mixedAssetFlag = isMixedDeal(self.资产池)
-        (lastAssetDate,lastCloseDate) = getStartDate(self.日期)
         """
         get the json formatted string
         """
+        part = dealParts(self).get
+        parsedDates = part("dates", (self.日期,), lambda: mkDate(self.日期))
+        defaultStartDate = self.日期.get("起息日", None) or self.日期['归集日'][0]
+        (lastAssetDate,lastCloseDate) = getStartDate(self.日期)
         _r = {
             "dates": parsedDates,
             "name": self.名称,
             "status": mkStatus(self.状态),
-            "pool":  mkPoolType(lastAssetDate, self.资产池, mixedAssetFlag),
-            "bonds": {bn: mkBndComp(bn, bo) for (bn, bo) in self.债券 },
-            "waterfall": mkWaterfall({},self.分配规则.copy()),
-            "fees": {fn: mkFee(fo|{"名称":fn}, fsDate=defaultStartDate) for (fn, fo) in self.费用 },
-            "accounts": {an:mkAcc(an,ao) for (an, ao) in self.账户 },
-            "collects": [ mkCollection(c) for c in self.归集规则],
-            "rateSwap": {k:mkRateSwap(v) for k,v in self.利率对冲.items()} if self.利率对冲 else None,
+            "pool": part("pool", (self.资产池, lastAssetDate), lambda: mkPoolType(lastAssetDate, self.资产池, isMixedDeal(self.资产池))),
+            "bonds": part("bonds", (self.债券,), lambda: {bn: mkBndComp(bn, bo) for (bn, bo) in self.债券 }),
+            "waterfall": part("waterfall", (self.分配规则,), lambda: mkWaterfalls(self.分配规则)),
+            "fees": part("fees", (self.费用, defaultStartDate), lambda: {fn: mkFee(fo|{"名称":fn}, fsDate=defaultStartDate) for (fn, fo) in self.费用 }),
+            "accounts": part("accounts", (self.账户,), lambda: {an:mkAcc(an,ao) for (an, ao) in self.账户 }),
+            "collects": part("collects", (self.归集规则,), lambda: [ mkCollection(c) for c in self.归集规则]),
+            "rateSwap": part("rateSwap", (self.利率对冲,), lambda: {k:mkRateSwap(v) for k,v in self.利率对冲.items()} if self.利率对冲 else None),
             "currencySwap": None,
-            "custom": {cn:mkCustom(co) for cn,co in self.自定义.items()} if self.自定义 else None,
-            "triggers": renameKs2({k: {_k: mkTrigger(_v) for (_k,_v) in v.items()} for (k,v) in self.触发事件.items() },chinaDealCycle) if self.触发事件 else None,
-            "liqProvider": {ln: mkLiqProvider(ln, lo | {"起始日":defaultStartDate} ) 
-                                for ln,lo in self.流动性支持.items() } if self.流动性支持 else None,
-            "ledgers": {ln: mkLedger(ln, v) for ln,v in self.科目.items()} if self.科目 else None
+            "custom": part("custom", (self.自定义,), lambda: {cn:mkCustom(co) for cn,co in self.自定义.items()} if self.自定义 else None),
+            "triggers": part("triggers", (self.触发事件,), lambda: renameKs2({k: {_k: mkTrigger(_v) for (_k,_v) in v.items()} for (k,v) in self.触发事件.items() },chinaDealCycle) if self.触发事件 else None),
+            "liqProvider": part("liqProvider", (self.流动性支持, defaultStartDate), lambda: {ln: mkLiqProvider(ln, lo | {"起始日":defaultStartDate} ) 
+                                for ln,lo in self.流动性支持.items() } if self.流动性支持 else None),
+            "ledgers": part("ledgers", (self.科目,), lambda: {ln: mkLedger(ln, v) for ln,v in self.科目.items()} if self.科目 else None)
         }
         
-        _dealType = identify_deal_type(_r)
+        _dealType = part("dealType", (_r["pool"],), lambda: identify_deal_type(_r))
 
         return mkTag((_dealType,_r))
 
@@ -1,14 +1,13 @@
 from absbox.local.util import mkTag, mkTs, readTagStr, subMap, subMap2, renameKs, ensure100
 from absbox.local.util import mapListValBy, uplift_m_list, mapValsBy, allList, getValWithKs, applyFnToKey,flat
 from absbox.local.util import earlyReturnNone, mkFloatTs, mkRateTs, mkRatioTs, mkTbl, mapNone, guess_pool_flow_header
-from absbox.local.util import filter_by_tags, enumVals, lmap, readTagMap
+from absbox.local.util import filter_by_tags, enumVals, lmap, readTagMap, memoize, freeze, freezeSeq
 from absbox.local.base import *
 
-from absbox.validation import vDict, vList, vStr, vNum, vInt, vDate, vFloat, vBool
+from absbox.validation import vDict, vList, vStr, vNum, vInt, vDate, vFloat, vBool, getValidationMode, vAssetColumns
 from schema import Or
 from enum import Enum
 import itertools
-import functools
 import logging
 import toolz as tz
 from lenses import lens
@@ -172,9 +171,9 @@ def mkPoolSource(x):
             raise RuntimeError(f"not match found: {x} :make Pool Source")
 
 
-@functools.lru_cache(maxsize=128)
+@memoize(key=freezeSeq)
 def mkDs(x):
-    "Making Deal Stats"
+    "Making Deal Stats, same formulas are translated once and share the result"
     match x:
         case ("债券余额",) | ("bondBalance",):
             return mkTag("CurrentBondBalance")
@@ -756,6 +755,7 @@ def mkRateCap(x):
             raise RuntimeError(f"Failed to match :{x}:Interest Cap")
 
 
+@memoize()
 def mkRateType(x):
     match x :
         case {"fix":r} | {"固定":r} | ["fix", r] | ["固定", r]:
@@ -822,6 +822,7 @@ def mkOrder(x):
             return "ByStartDate"
 
 
+@memoize()
 def mkAction(x:list):
     ''' make waterfall actions '''
     def mkMod(y: dict) -> tuple:
@@ -1133,6 +1134,12 @@ def mkWaterfall(r, x):
     r[_w_tag] = lmap(mkAction, _v)
     return mkWaterfall(r, x)
 
+
+@memoize(maxsize=256)
+def mkWaterfalls(x: dict) -> dict:
+    ''' make waterfalls of a deal, same waterfalls are translated once and shared by deals '''
+    return mkWaterfall({}, x.copy())
+
 def mkRoundingType(x):
     match x:
         case ["floor", r]:
@@ -1158,6 +1165,7 @@ def mkAssetRate(x):
             raise RuntimeError(f"Failed to match {x}:mkAssetRate")
 
 
+@memoize()
 def mkAmortPlan(x) -> dict:
     match x:
         case "等额本息" | "Level" | "level":
@@ -1184,6 +1192,7 @@ def mkAmortPlan(x) -> dict:
             raise RuntimeError(f"Failed to match AmortPlan {x}:mkAmortPlan")
 
 
+@memoize()
 def mkArm(x:dict):
     match x:
         case {"initPeriod": ip}:
@@ -1193,6 +1202,7 @@ def mkArm(x:dict):
             raise RuntimeError(f"Failed to match ARM  {x}:mkArm")
 
 
+@memoize()
 def mkAssetStatus(x):
     match x:
         case "正常" | "Current" | "current":
@@ -1205,6 +1215,7 @@ def mkAssetStatus(x):
             raise RuntimeError(f"Failed to match asset statuts {x}:mkAssetStatus")
 
 
+@memoize()
 def mkPrepayPenalty(x):
     """ Build Prepayment Penalty Setting """
     if x is None:
@@ -1264,6 +1275,9 @@ def mkCapacity(x):
 
 def mkAsset(x):
     match x:
+        case {"tag": _, "contents": _}:
+            # translated already, e.g by `mkPoolFromFrame`
+            return x
         case ["AdjustRateMortgage", {"originBalance": originBalance, "originRate": originRate, "originTerm": originTerm, "freq": freq, "type": _type, "originDate": startDate, "arm": arm}
              , {"currentBalance": currentBalance, "currentRate": currentRate, "remainTerm": remainTerms, "status": status}]:
             borrowerNum = x[2].get("borrowerNum", None)
@@ -1604,7 +1618,14 @@ def mkAssumpType(x):
             raise RuntimeError(f"failed to match {x} | mkAssumpType")
 
 
+assetUnionTags = {"Mortgage": "MO", "AdjustRateMortgage": "MO", "PersonalLoan": "LO", "Installment": "IL"
+                  , "RegularLease": "LS", "StepUpLease": "LS", "FixedAsset": "FA", "Invoice": "RE"
+                  , "ProjectedFlowFixed": "PF", "ProjectedFlowMixFloater": "PF"}
+
+
 def mkAssetUnion(x):
+    if isinstance(x, dict):
+        return mkTag((assetUnionTags[x['tag']], mkAsset(x)))
     match x[0]:
         case "AdjustRateMortgage" | "Mortgage" | "按揭贷款" :
             return mkTag(("MO", mkAsset(x)))
@@ -1637,20 +1658,92 @@ def mkRevolvingPool(x):
             return mkTag(("AssetCurve",assetCurve))
 
 
-def mkPoolType(assetDate, x, mixedFlag) -> dict:
+def mkPoolType(assetDate, x, mixedFlag, columnar=False) -> dict:
     if 'assets' in x or "清单" in x or "归集表" in x:
-        return mkTag(("SoloPool" ,mkPoolComp(vDate(assetDate), x, False)))
+        return mkTag(("SoloPool" ,mkPoolComp(vDate(assetDate), x, False, columnar)))
     elif 'deals' in x and isinstance(x['deals'],dict):
         return mkTag(("ResecDeal",{f"{dealObj.json['contents']['name']}:{bn}:{sd}:{str(pct)}": \
                                     {"deal":dealObj.json['contents'],"future":None,"futureScheduleCf":None,"issuanceStat":None}\
                                       for ((bn,pct,sd),dealObj) in x['deals'].items()} ))
     else:
-        return mkTag(("MultiPool" ,{f"PoolName:{k}":mkPoolComp(vDate(assetDate),v,mixedFlag) for (k,v) in x.items()}))
+        return mkTag(("MultiPool" ,{f"PoolName:{k}":mkPoolComp(vDate(assetDate),v,mixedFlag,columnar) for (k,v) in x.items()}))
+
+
+def mkColumn(vs: list) -> dict:
+    """ encode values of a column: `const` for single value, `specs`/`codes` for repeated values, otherwise `values` """
+    types = set(map(type, vs))
+    if types <= {int, float}:
+        if len(types) == 1 and len(set(vs)) == 1:
+            return {"const": vs[0]}
+        return {"values": vs}
+    if types & {dict, list, tuple}:
+        # sub-objects translated by memoized functions are shared, so look up by identity before by value
+        keys = list(map(id, vs))
+        index, codeById = {}, {}
+        for (i, v) in dict(zip(keys, vs)).items():
+            codeById[i] = index.setdefault(freeze(v), len(index))
+        specs = [None]*len(index)
+        for (i, v) in zip(keys, vs):
+            specs[codeById[i]] = v
+        codes = list(map(codeById.__getitem__, keys))
+    else:
+        keys = vs if types <= {str, type(None)} else [(type(v), v) for v in vs]
+        index = {k: c for (c, k) in enumerate(dict.fromkeys(keys))}
+        specs = list(index.keys()) if keys is vs else [v for (_, v) in index.keys()]
+        codes = list(map(index.__getitem__, keys))
+    if len(specs) == 1:
+        return {"const": specs[0]}
+    if not (types & {dict, list, tuple}) and len(specs)*2 > len(vs):
+        return {"values": vs}
+    return {"specs": specs, "codes": codes}
+
+
+def mkColumnarAssets(assets: list) -> dict:
+    """ encode translated assets in columns: assets of same type and fields are grouped, each field of a group is a column by `mkColumn`
+
+    `rows` of a group are positions of its assets in `assets`, omitted if there is only one group
+    """
+    groups = {}
+    for (i, ast) in enumerate(assets):
+        union, a = None, ast
+        if isinstance(ast["contents"], dict) and "tag" in ast["contents"]:
+            union, a = ast["tag"], ast["contents"]
+        cs = a["contents"]
+        record = tuple(cs[0].keys()) if cs and isinstance(cs[0], dict) else None
+        groups.setdefault((union, a["tag"], len(cs), record), []).append((i, cs))
+    r = []
+    for ((union, tag, width, record), xs) in groups.items():
+        rows = [cs for (_, cs) in xs]
+        columns = [mkColumn([cs[0][k] for cs in rows]) for k in record] if record else []
+        columns += [mkColumn([cs[j] for cs in rows]) for j in range(1 if record else 0, width)]
+        r.append({"union": union, "tag": tag, "width": width, "size": len(xs), "record": record and list(record)
+                  , "rows": [i for (i, _) in xs] if len(groups) > 1 else None, "columns": columns})
+    return mkTag(("ColumnarAssets", r))
+
+
+def mkColumnarPool(x: dict) -> dict:
+    """ encode assets of a translated `SoloPool`/`MultiPool` in columns, other pools are returned as is """
+    def encode(p):
+        assets = p.get("assets")
+        if isinstance(assets, list) and assets:
+            return p | {"assets": mkColumnarAssets(assets)}
+        return p
+    match x:
+        case {"tag": "SoloPool", "contents": p}:
+            return mkTag(("SoloPool", encode(p)))
+        case {"tag": "MultiPool", "contents": ps}:
+            return mkTag(("MultiPool", {k: encode(p) for k, p in ps.items()}))
+        case _:
+            return x
 
 
-def mkPoolComp(asOfDate, x, mixFlag) -> dict:
+def mkPoolComp(asOfDate, x, mixFlag, columnar=False) -> dict:
     assetFactory = mkAsset if (not mixFlag) else mkAssetUnion
-    r = {"assets": [assetFactory(y) for y in getValWithKs(x, ['assets', "清单"],defaultReturn=[])]
+    assets = getValWithKs(x, ['assets', "清单"],defaultReturn=[])
+    if getValidationMode() == "trusted":
+        vAssetColumns(assets)
+    _assets = [assetFactory(y) for y in assets]
+    r = {"assets": mkColumnarAssets(_assets) if columnar and _assets else _assets
         , "asOfDate": asOfDate
         , "issuanceStat": getValWithKs(x,["issuanceStat", "统计"])
         , "futureCf":mkCf(getValWithKs(x,['cashflow', '现金流归集表', '归集表'],[]))
@@ -1674,6 +1767,8 @@ def mkPool(x: dict):
                "VDeal": "VPool", "UDeal":"UPool"}
     match x:
         case {"清单": assets, "封包日": d} | {"assets": assets, "cutoffDate": d}:
+            if getValidationMode() == "trusted":
+                vAssetColumns(assets)
             _pool = {"assets": [mkAsset(a) for a in assets] , "asOfDate": d}
             _pool_asset_type = identify_deal_type({"pool": _pool})
             return mkTag((mapping[_pool_asset_type], _pool))
@@ -1681,6 +1776,178 @@ def mkPool(x: dict):
             raise RuntimeError(f"Failed to match {x}:mkPool")
 
 
+frameAssetFields = {
+    "Mortgage": (["originBalance", "originRate", "originTerm", "freq", "type", "originDate", "currentBalance", "currentRate", "remainTerm", "status"]
+                 , ["borrowerNum", "prepayPenalty", "arm"]),
+    "Loan": (["originBalance", "originRate", "originTerm", "freq", "type", "originDate", "currentBalance", "currentRate", "remainTerm", "status"]
+             , []),
+    "Installment": (["originBalance", "feeRate", "originTerm", "freq", "type", "originDate", "currentBalance", "remainTerm", "status"]
+                    , []),
+    "Lease": (["originTerm", "freq", "originDate", "status", "remainTerm"]
+              , ["fixRental", "initRental", "accrue", "pct"]),
+}
+""" required and optional fields of asset types supported by `mkPoolFromFrame` """
+
+
+def mkPoolFromFrame(df: pd.DataFrame, assetType: str = "Mortgage", columns: dict = None, defaults: dict = None) -> list:
+    """ Build assets from a loan tape, one asset per row, same as `mkAsset` on each row but validated and translated column by column
+
+    * numeric/date columns are validated vectorized, dates can be `YYYY-MM-DD` strings or datetime
+    * values of rate/amortization/status/frequency columns are translated once per unique value
+    * a numeric rate column is a fix rate, same as `{"fix": r}`
+
+    .. code-block:: python
+
+        assets = mkPoolFromFrame(tape, "Mortgage", columns={"currentBalance": "cur_bal", "remainTerm": "rem_term"}
+                                 , defaults={"freq": "Monthly", "type": "Level", "status": "Current"})
+        deal = Generic(.., pool={"assets": assets, "cutoffDate": "2021-03-01"}, ..)
+
+    :param df: loan tape
+    :type df: pd.DataFrame
+    :param assetType: 'Mortgage', 'Loan', 'Installment' or 'Lease', a mortgage with `arm` column is an adjust rate mortgage
+    :type assetType: str
+    :param columns: map from field of asset (same as keys in `mkAsset`) to column name, defaults to column with same name as field
+    :type columns: dict, optional
+    :param defaults: value of a field not in the frame, applied to all assets
+    :type defaults: dict, optional
+    :return: a list of assets translated, can be used as `assets` of a pool
+    :rtype: list
+    """
+    assetType = {"按揭贷款": "Mortgage", "贷款": "Loan", "分期": "Installment", "租赁": "Lease"}.get(assetType, assetType)
+    if assetType not in frameAssetFields:
+        raise RuntimeError(f"Failed to match asset type {assetType}, only support {list(frameAssetFields.keys())}:mkPoolFromFrame")
+    columns = columns or {}
+    defaults = defaults or {}
+    n = len(df)
+    (required, optional) = frameAssetFields[assetType]
+
+    def col(field):
+        c = columns.get(field, field)
+        if c in df.columns:
+            return df[c]
+        if field in defaults:
+            return ("default", defaults[field])
+        if field in required:
+            raise RuntimeError(f"Missing column {c} for field {field} of {assetType}:mkPoolFromFrame")
+        return None
+
+    def bad(field, mask):
+        rows = df.index[mask.to_numpy()][:5].tolist()
+        return RuntimeError(f"Invalid value of field {field} in column {columns.get(field, field)} at rows {rows}:mkPoolFromFrame")
+
+    def nums(field, validate=vNum, integer=False):
+        s = col(field)
+        if isinstance(s, tuple):
+            return [validate(s[1])]*n
+        if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            raise bad(field, ~s.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)))
+        if s.isna().any():
+            raise bad(field, s.isna())
+        if integer:
+            if (s % 1 != 0).any():
+                raise bad(field, s % 1 != 0)
+            return s.astype("int64").tolist()
+        return s.tolist()
+
+    def dates(field):
+        s = col(field)
+        if isinstance(s, tuple):
+            return [vDate(s[1])]*n
+        if pd.api.types.is_datetime64_any_dtype(s):
+            if s.isna().any():
+                raise bad(field, s.isna())
+            return s.dt.strftime("%Y-%m-%d").tolist()
+        if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+            raise bad(field, s.notna() | s.isna())
+        ok = s.str.fullmatch(r"\d{4}-\d{2}-\d{2}").eq(True)
+        if not ok.all():
+            raise bad(field, ~ok)
+        return s.tolist()
+
+    def byValue(field, fn):
+        """ translate unique values of a column by `fn`, missing values are None """
+        s = col(field)
+        if s is None:
+            return [None]*n
+        if isinstance(s, tuple):
+            return [fn(s[1])]*n
+        vals = s.astype(object)
+        try:
+            codes, uniques = pd.factorize(vals, use_na_sentinel=False)
+            uniques = uniques.tolist()
+        except TypeError:
+            # unhashable values, e.g rate specs in dict
+            keys = vals.map(repr)
+            codes, _ = pd.factorize(keys)
+            uniques = vals.iloc[pd.Series(range(n)).groupby(codes).first().to_numpy()].tolist()
+        translated = []
+        for (i, u) in enumerate(uniques):
+            try:
+                translated.append(fn(None if pd.api.types.is_scalar(u) and pd.isna(u) else u))
+            except Exception as e:
+                raise bad(field, pd.Series(codes == i)) from e
+        return [translated[c] for c in codes.tolist()]
+
+    def rates(field):
+        s = col(field)
+        if not isinstance(s, tuple) and pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            nums(field)
+            return byValue(field, lambda r: mkTag(("Fix", [DC.DC_ACT_365F.value, r])))
+        return byValue(field, notNone(mkRateType))
+
+    def notNone(fn):
+        """ translation of a required field must not be None """
+        def f(v):
+            if v is None:
+                raise RuntimeError("Missing value:mkPoolFromFrame")
+            return fn(v)
+        return f
+
+    statuses = byValue("status", notNone(mkAssetStatus))
+    if assetType == "Lease":
+        terms, startDates, remainTerms = nums("originTerm", vInt, True), dates("originDate"), nums("remainTerm", vInt, True)
+        paymentDates = byValue("freq", notNone(mkDatePattern))
+        if col("fixRental") is not None:
+            rentals = nums("fixRental")
+            return [{"tag": "RegularLease", "contents": [{"originTerm": ot, "startDate": sd, "paymentDates": dp, "originRental": r, "tag": "LeaseInfo"}, 0, rt, st]}
+                    for (ot, sd, dp, r, rt, st) in zip(terms, startDates, paymentDates, rentals, remainTerms, statuses)]
+        if col("initRental") is None:
+            raise RuntimeError(f"Missing column of fixRental or initRental for {assetType}:mkPoolFromFrame")
+        rentals, accrues = nums("initRental"), byValue("accrue", notNone(mkDatePattern))
+        plans = [mkTag(("ByRateCurve" if isinstance(r, list) else "FlatRate", [acc, r])) for (acc, r) in zip(accrues, byValue("pct", notNone(lambda r: r)))]
+        return [{"tag": "StepUpLease", "contents": [{"originTerm": ot, "startDate": sd, "paymentDates": dp, "originRental": r, "tag": "LeaseInfo"}, plan, 0, rt, st]}
+                for (ot, sd, dp, r, plan, rt, st) in zip(terms, startDates, paymentDates, rentals, plans, remainTerms, statuses)]
+
+    infoTag = "MortgageOriginalInfo" if assetType == "Mortgage" else "LoanOriginalInfo"
+    rateField = "feeRate" if assetType == "Installment" else "originRate"
+    infoFields = [nums("originBalance"), rates(rateField), nums("originTerm", vInt, True)
+                  , byValue("freq", notNone(lambda f: freqMap[f])), dates("originDate"), byValue("type", notNone(mkAmortPlan))]
+    if assetType == "Mortgage":
+        infos = [{"originBalance": ob, "originRate": r, "originTerm": ot, "period": p, "startDate": sd, "prinType": pt, "prepaymentPenalty": pp, "tag": infoTag}
+                 for (ob, r, ot, p, sd, pt, pp) in zip(*infoFields, byValue("prepayPenalty", mkPrepayPenalty))]
+    else:
+        infos = [{"originBalance": ob, "originRate": r, "originTerm": ot, "period": p, "startDate": sd, "prinType": pt, "tag": infoTag}
+                 for (ob, r, ot, p, sd, pt) in zip(*infoFields)]
+    currentBalances, remainTerms = nums("currentBalance"), nums("remainTerm", vInt, True)
+
+    match assetType:
+        case "Mortgage":
+            currentRates = nums("currentRate")
+            borrowerNums = byValue("borrowerNum", lambda v: int(v) if isinstance(v, float) and v.is_integer() else v)
+            if col("arm") is not None:
+                arms = byValue("arm", notNone(mkArm))
+                return [{"tag": "AdjustRateMortgage", "contents": [info, arm, cb, cr, rt, bn, st]}
+                        for (info, arm, cb, cr, rt, bn, st) in zip(infos, arms, currentBalances, currentRates, remainTerms, borrowerNums, statuses)]
+            return [{"tag": "Mortgage", "contents": [info, cb, cr, rt, bn, st]}
+                    for (info, cb, cr, rt, bn, st) in zip(infos, currentBalances, currentRates, remainTerms, borrowerNums, statuses)]
+        case "Loan":
+            return [{"tag": "PersonalLoan", "contents": [info, cb, cr, rt, st]}
+                    for (info, cb, cr, rt, st) in zip(infos, currentBalances, nums("currentRate"), remainTerms, statuses)]
+        case "Installment":
+            return [{"tag": "Installment", "contents": [info, cb, rt, st]}
+                    for (info, cb, rt, st) in zip(infos, currentBalances, remainTerms, statuses)]
+
+
 def mkCustom(x: dict):
     match x:
         case {"常量": n} | {"Constant": n}:
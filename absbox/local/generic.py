@@ -3,7 +3,7 @@ import functools
 
 from absbox.local.util import mkTag,mapListValBy,mapValsBy,renameKs2\
                               ,guess_pool_flow_header,positionFlow,mapNone\
-                              ,isMixedDeal
+                              ,isMixedDeal,dealParts
 from absbox.local.util import earlyReturnNone,lmap                              
 from absbox.local.component import *
 from absbox.local.base import * 
@@ -46,35 +46,44 @@ class Generic:
     ledgers: dict = None
     rateCap: dict = None
 
-    @property
+    def __setattr__(self, name, value):
+        self.__dict__.pop("json", None)
+        object.__setattr__(self, name, value)
+
+    def invalidate(self) -> None:
+        """ drop cached json and field translations after mutating a field in place, e.g `deal.pool['assets'].append(..)` """
+        self.__dict__.pop("json", None)
+        dealParts(self).clear()
+
+    @functools.cached_property
     def json(self) -> dict:
-        parsedDates = mkDate(self.dates)
-        (lastAssetDate, lastCloseDate) = getStartDate(self.dates)
-        mixedAssetFlag = isMixedDeal(self.pool)
         """
-        get the json formatted string
+        get the json formatted string, fields not replaced since last call are not translated again
         """
+        part = dealParts(self).get
+        parsedDates = part("dates", (self.dates,), lambda: mkDate(self.dates))
+        (lastAssetDate, lastCloseDate) = getStartDate(self.dates)
         _r = {
             "dates": parsedDates,
             "name": vStr(self.name),
             "status":mkStatus(self.status),
-            "pool":mkPoolType(lastAssetDate, self.pool, mixedAssetFlag),
-            "bonds": {bn: mkBndComp(bn, bo) for (bn, bo) in self.bonds},
-            "waterfall": mkWaterfall({},self.waterfall.copy()),  
-            "fees": {fn: mkFee(fo|{"name": fn}, fsDate = lastCloseDate) for (fn, fo) in self.fees},
-            "accounts": {an:mkAcc(an, ao) for (an, ao) in self.accounts},
-            "collects": lmap(mkCollection, self.collection),
-            "rateSwap": tz.valmap(mkRateSwap, self.rateSwap) if self.rateSwap else None,
-            "rateCap": tz.valmap(mkRateCap, self.rateCap) if self.rateCap else None,
+            "pool": part("pool", (self.pool, lastAssetDate), lambda: mkPoolType(lastAssetDate, self.pool, isMixedDeal(self.pool))),
+            "bonds": part("bonds", (self.bonds,), lambda: {bn: mkBndComp(bn, bo) for (bn, bo) in self.bonds}),
+            "waterfall": part("waterfall", (self.waterfall,), lambda: mkWaterfalls(self.waterfall)),
+            "fees": part("fees", (self.fees, lastCloseDate), lambda: {fn: mkFee(fo|{"name": fn}, fsDate = lastCloseDate) for (fn, fo) in self.fees}),
+            "accounts": part("accounts", (self.accounts,), lambda: {an:mkAcc(an, ao) for (an, ao) in self.accounts}),
+            "collects": part("collects", (self.collection,), lambda: lmap(mkCollection, self.collection)),
+            "rateSwap": part("rateSwap", (self.rateSwap,), lambda: tz.valmap(mkRateSwap, self.rateSwap) if self.rateSwap else None),
+            "rateCap": part("rateCap", (self.rateCap,), lambda: tz.valmap(mkRateCap, self.rateCap) if self.rateCap else None),
             "currencySwap":None ,
-            "custom": tz.valmap(mkCustom, self.custom) if self.custom else None,
-            "triggers": renameKs2({k: {_k: mkTrigger(_v) for (_k,_v) in v.items() } for (k, v) in self.trigger.items()},englishDealCycle) if self.trigger else None,
-            "liqProvider": {ln: mkLiqProvider(ln, lo | {"start":lastCloseDate} ) 
-                               for ln,lo in self.liqFacility.items() } if self.liqFacility else None,
-            "ledgers": {ln: mkLedger(ln, v) for ln,v in self.ledgers.items()} if self.ledgers else None
+            "custom": part("custom", (self.custom,), lambda: tz.valmap(mkCustom, self.custom) if self.custom else None),
+            "triggers": part("triggers", (self.trigger,), lambda: renameKs2({k: {_k: mkTrigger(_v) for (_k,_v) in v.items() } for (k, v) in self.trigger.items()},englishDealCycle) if self.trigger else None),
+            "liqProvider": part("liqProvider", (self.liqFacility, lastCloseDate), lambda: {ln: mkLiqProvider(ln, lo | {"start":lastCloseDate} ) 
+                               for ln,lo in self.liqFacility.items() } if self.liqFacility else None),
+            "ledgers": part("ledgers", (self.ledgers,), lambda: {ln: mkLedger(ln, v) for ln,v in self.ledgers.items()} if self.ledgers else None)
         }
 
-        _dealType = identify_deal_type(_r)
+        _dealType = part("dealType", (_r["pool"],), lambda: identify_deal_type(_r))
 
         return mkTag((_dealType, _r))
 
@@ -0,0 +1,137 @@
+import time, threading, functools, collections, contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+
+
+PHASES = ("build", "serialize", "transfer", "decode", "read")
+
+_state = threading.local()
+_lock = threading.Lock()
+
+
+@dataclass
+class Profiler:
+    """ Collect timing of API calls, one record per call with seconds spent in each phase
+
+    * build: translate deal/pool/assumptions into engine format
+    * serialize: dump request to json text
+    * transfer: send request and wait for response, including engine computation
+    * decode: parse response json
+    * read: convert response into dataframes
+
+    durations of concurrent requests in a call (e.g chunks of `runStructs`) are summed up,
+    a phase nested in another one (e.g a request sent while building) is counted in the inner phase only
+
+    .. code-block:: python
+
+        with api.profile() as p:
+            api.runByScenarios(deal, poolAssump=scenarios)
+        p.toDataFrame()
+
+        # or keep it on API and send records to a sink
+        api = API(EnginePath.LOCAL, profiler=Profiler(sink=logger.info))
+
+    """
+    sink: callable = None
+    """ function called with each record once a call completes, defaults to None """
+    maxRecords: int = 10000
+    """ max number of records kept in memory """
+
+    def __post_init__(self) -> None:
+        self.records = collections.deque(maxlen=self.maxRecords)
+
+    def add(self, record: dict) -> None:
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """ records of calls as a dataframe """
+        return pd.DataFrame(list(self.records))
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+def profiled(fn):
+    """ open a record on `profiler` of API for the call, calls nested in a profiled call are counted in the outer one """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None or getattr(_state, "record", None) is not None:
+            return fn(self, *args, **kwargs)
+        record = {"method": fn.__name__, "start": datetime.now(), "endpoint": None, "scenarios": 1
+                  , **{p: 0.0 for p in PHASES}, "requestBytes": 0, "responseBytes": 0, "cached": False}
+        _state.record = record
+        started = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            _state.record = None
+            record["total"] = time.perf_counter() - started
+            self.profiler.add(record)
+    return wrapper
+
+
+@contextmanager
+def phase(name: str):
+    """ add time spent in the block to phase `name` of current record, time of a nested phase is taken out of the outer one """
+    record = getattr(_state, "record", None)
+    if record is None:
+        yield
+        return
+    outer = getattr(_state, "phase", None)
+    _state.phase = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _state.phase = outer
+        with _lock:
+            record[name] += elapsed
+            if outer is not None:
+                record[outer] -= elapsed
+
+
+def note(**kwargs) -> None:
+    """ set fields of current record, numeric fields ending with `Bytes` are accumulated """
+    record = getattr(_state, "record", None)
+    if record is None:
+        return
+    with _lock:
+        for k, v in kwargs.items():
+            record[k] = record[k] + v if k.endswith("Bytes") else v
+
+
+def carry(fn):
+    """ wrap `fn` to be run in another thread, with context variables (i.e validation mode) of the calling thread and updating its record """
+    record = getattr(_state, "record", None)
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        _state.record = record
+        try:
+            # a context can't be entered by two threads at once
+            return context.copy().run(fn, *args, **kwargs)
+        finally:
+            _state.record = None
+    return wrapper
+
+
+def timed(it, name: str):
+    """ iterate `it`, adding time spent to produce each item to phase `name` of current record """
+    if getattr(_state, "record", None) is None:
+        yield from it
+        return
+    it = iter(it)
+    while True:
+        with phase(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,122 @@
+import json, zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+""" same output as `json.dumps(x, ensure_ascii=False)` """
+
+
+def iterJson(x, sliceSize=256):
+    """ json text of `x` in pieces, same as `json.dumps(x, ensure_ascii=False)` once joined
+
+    dicts and lists are walked into, a list longer than `sliceSize` (i.e assets of a pool, values of a column) is dumped `sliceSize` items at a time
+    """
+    match x:
+        case dict() if x and all(isinstance(k, str) for k in x):
+            sep = "{"
+            for k, v in x.items():
+                yield f"{sep}{_encode(k)}: "
+                yield from iterJson(v, sliceSize)
+                sep = ", "
+            yield "}"
+        case list() | tuple() if len(x) > sliceSize:
+            yield "["
+            for i in range(0, len(x), sliceSize):
+                s = _encode(x[i:i+sliceSize])[1:-1]
+                yield s if i == 0 else f", {s}"
+            yield "]"
+        case list() | tuple() if x:
+            sep = "["
+            for v in x:
+                yield sep
+                yield from iterJson(v, sliceSize)
+                sep = ", "
+            yield "]"
+        case _:
+            yield _encode(x)
+
+
+def jsonSize(x, sliceSize=256) -> int:
+    """ estimated bytes of utf-8 json text of `x`, a list longer than `sliceSize` is estimated from its first `sliceSize` items """
+    match x:
+        case dict() if x and all(isinstance(k, str) for k in x):
+            return sum(len(_encode(k).encode('utf-8')) + 4 + jsonSize(v, sliceSize) for k, v in x.items())
+        case list() | tuple() if len(x) > sliceSize:
+            return len(_encode(x[:sliceSize]).encode('utf-8')) * len(x) // sliceSize
+        case list() | tuple() if x:
+            return sum(2 + jsonSize(v, sliceSize) for v in x)
+        case _:
+            return len(_encode(x).encode('utf-8'))
+
+
+def compressChunks(chunks, encoding: str):
+    """ compress byte chunks into a single gzip/zstd stream """
+    match encoding:
+        case "gzip":
+            c = zlib.compressobj(6, zlib.DEFLATED, 31)
+        case "zstd":
+            c = zstandard.ZstdCompressor().compressobj()
+        case _:
+            raise RuntimeError(f"Failed to match encoding:{encoding}")
+    for chunk in chunks:
+        out = c.compress(chunk)
+        if out:
+            yield out
+    yield c.flush()
+
+
+class JsonBody:
+    """ Request body serialized while it is sent: json text is produced chunk by chunk on each iteration,
+    so the whole request text is never held in memory. `requests` sends an iterable body with chunked transfer encoding
+
+    the request object is walked again on every iteration (e.g retries), `str()` returns the whole text for debug
+    """
+    def __init__(self, obj, chunkSize=1024*1024, encoding=None) -> None:
+        self.obj = obj
+        self.chunkSize = chunkSize
+        self.encoding = encoding
+        self.size = 0
+        """ bytes produced by last complete iteration, compressed if `encoding` is set """
+
+    def chunks(self):
+        """ utf-8 bytes of json text, in chunks of about `chunkSize` """
+        buf, n = [], 0
+        for s in iterJson(self.obj):
+            buf.append(s)
+            n += len(s)
+            if n >= self.chunkSize:
+                yield "".join(buf).encode('utf-8')
+                buf, n = [], 0
+        if buf:
+            yield "".join(buf).encode('utf-8')
+
+    def __iter__(self):
+        size = 0
+        for chunk in (self.chunks() if self.encoding is None else compressChunks(self.chunks(), self.encoding)):
+            size += len(chunk)
+            yield chunk
+        self.size = size
+
+    def head(self, n: int) -> bytes | None:
+        """ whole body in bytes if it is shorter than `n` bytes, otherwise None """
+        buf, size = [], 0
+        for chunk in self.chunks():
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= n:
+                return None
+        return b"".join(buf)
+
+    def estimate(self) -> int:
+        """ bytes of body before it is sent: `size` of last iteration, otherwise estimated size of json text (before compression) """
+        return self.size or jsonSize(self.obj)
+
+    def encoded(self, encoding: str | None) -> "JsonBody":
+        """ same body compressed by `encoding` """
+        return JsonBody(self.obj, self.chunkSize, encoding)
+
+    def __str__(self) -> str:
+        return "".join(iterJson(self.obj))
@@ -0,0 +1,219 @@
+import random, dataclasses
+from datetime import date
+
+import pandas as pd
+import toolz as tz
+
+from absbox.local.util import freeze, getValWithKs
+from absbox.local.generic import Generic
+from absbox.local.china import SPV
+
+
+fieldKeys = {
+    "english": {"ob": "originBalance", "or": "originRate", "ot": "originTerm", "od": "originDate", "freq": "freq", "type": "type"
+                , "cb": "currentBalance", "cr": "currentRate", "rt": "remainTerm", "st": "status", "bn": "borrowerNum", "pp": "prepayPenalty"},
+    "chinese": {"ob": "放款金额", "or": "放款利率", "ot": "初始期限", "od": "放款日", "freq": "频率", "type": "类型"
+                , "cb": "当前余额", "cr": "当前利率", "rt": "剩余期限", "st": "状态", "bn": "借款人数量", "pp": "早偿罚息"},
+}
+
+repLineAssets = {"Mortgage": fieldKeys["english"], "Loan": fieldKeys["english"]
+                 , "Installment": fieldKeys["english"] | {"or": "feeRate", "cr": None}
+                 , "按揭贷款": fieldKeys["chinese"], "贷款": fieldKeys["chinese"]
+                 , "分期": fieldKeys["chinese"] | {"or": "放款费率", "cr": None}}
+""" asset types can be collapsed into rep lines, with keys of fields """
+
+poolFlowFields = {"english": ("Balance", ["Principal", "Interest", "Prepayment", "Default", "Recovery", "Loss"])
+                  , "chinese": ("余额", ["本金", "利息", "早偿金额", "违约金额", "回收金额", "损失金额"])}
+
+
+def fixRate(x):
+    """ rate of a fix rate spec, None if it is not a fix rate """
+    match x:
+        case ["fix", r] | ["固定", r] | ("fix", r) | ("固定", r) | {"fix": r} | {"固定": r}:
+            return r
+        case _:
+            return None
+
+
+def withFixRate(x, r):
+    """ fix rate spec in same form of `x` with rate `r` """
+    match x:
+        case dict():
+            return {k: r for k in x.keys()}
+        case _:
+            return [x[0], r]
+
+
+def repLineKey(ast, rateStep, termStep, ageStep):
+    """ bucket of an asset, None if it can't be collapsed into a rep line """
+    if not (isinstance(ast, (list, tuple)) and len(ast) == 3 and ast[0] in repLineAssets):
+        return None
+    ks = repLineAssets[ast[0]]
+    (o, c) = ast[1], ast[2]
+    try:
+        oRate = o[ks["or"]]
+        rate = c[ks["cr"]] if ks["cr"] else fixRate(oRate)
+        (ot, rt) = (o[ks["ot"]], c[ks["rt"]])
+        rateSpec = "fix" if fixRate(oRate) is not None else freeze(oRate)
+        return (ast[0], o[ks["freq"]], freeze(o[ks["type"]]), freeze(c[ks["st"]]), freeze(o.get(ks["pp"])), rateSpec
+                , round(rate/rateStep) if rate is not None else None, rt // termStep, (ot - rt) // ageStep)
+    except (KeyError, TypeError):
+        return None
+
+
+def collapse(xs: list) -> list:
+    """ one asset of a bucket, with balances summed up, rates/terms/dates weighted by current balance """
+    (t, o, c) = xs[0]
+    ks = repLineAssets[t]
+    bals = [x[2][ks["cb"]] for x in xs]
+    total = sum(bals)
+    ws = [b/total for b in bals] if total > 0 else [1/len(xs)]*len(xs)
+    wavg = lambda vs: sum(w*v for (w, v) in zip(ws, vs))
+
+    rt = max(1, round(wavg([x[2][ks["rt"]] for x in xs])))
+    ot = max(rt, round(wavg([x[1][ks["ot"]] for x in xs])))
+    od = date.fromordinal(round(wavg([date.fromisoformat(x[1][ks["od"]]).toordinal() for x in xs]))).isoformat()
+    _o = o | {ks["ob"]: sum(x[1][ks["ob"]] for x in xs), ks["ot"]: ot, ks["od"]: od}
+    if fixRate(o[ks["or"]]) is not None:
+        _o[ks["or"]] = withFixRate(o[ks["or"]], wavg([fixRate(x[1][ks["or"]]) for x in xs]))
+    _c = c | {ks["cb"]: total, ks["rt"]: rt}
+    if ks["cr"]:
+        _c[ks["cr"]] = wavg([x[2][ks["cr"]] for x in xs])
+    bns = [x[2].get(ks["bn"]) for x in xs]
+    if any(bn is not None for bn in bns):
+        _c[ks["bn"]] = sum(1 if bn is None else bn for bn in bns)
+    return [t, _o, _c]
+
+
+def repLineAssetList(assets: list, rateStep: float, termStep: int, ageStep: int) -> list:
+    buckets = {}
+    others = []
+    for ast in assets:
+        k = repLineKey(ast, rateStep, termStep, ageStep)
+        if k is None:
+            others.append(ast)
+        else:
+            buckets.setdefault(k, []).append(ast)
+    return [collapse(xs) if len(xs) > 1 else xs[0] for xs in buckets.values()] + others
+
+
+def mkRepLines(x, rateStep=0.0025, termStep=12, ageStep=12):
+    """ Collapse assets of a pool into rep lines: assets in same bucket of asset type, frequency, amortization type, status,
+    prepay penalty, rate, remaining term and age are replaced by one asset
+
+    * balances are summed up, rates/terms/origin date are averaged weighted by current balance
+    * Mortgage/Loan/Installment are supported, other assets (e.g ARM, lease or assets translated already) are kept as is
+    * assumptions by asset index no longer apply to a pool of rep lines
+
+    .. code-block:: python
+
+        repDeal = mkRepLines(deal, rateStep=0.005, termStep=24)
+        repLineReport(api, deal, repDeal, poolAssump=scenarios, sample=5)
+
+    :param x: a deal (`Generic`/`SPV`), a dict as input of `mkDeal`, a pool or a map of pools
+    :type x: Generic | SPV | dict
+    :param rateStep: width of rate bucket, defaults to 0.0025
+    :type rateStep: float, optional
+    :param termStep: width of remaining term bucket in periods, defaults to 12
+    :type termStep: int, optional
+    :param ageStep: width of age (origin term - remaining term) bucket in periods, defaults to 12
+    :type ageStep: int, optional
+    :return: same type of `x` with assets replaced by rep lines
+    """
+    f = lambda p: mkRepLines(p, rateStep, termStep, ageStep)
+    match x:
+        case Generic():
+            return dataclasses.replace(x, pool=f(x.pool))
+        case SPV():
+            return dataclasses.replace(x, 资产池=f(x.资产池))
+        case {"assets": list(assets)}:
+            return x | {"assets": repLineAssetList(assets, rateStep, termStep, ageStep)}
+        case {"清单": list(assets)}:
+            return x | {"清单": repLineAssetList(assets, rateStep, termStep, ageStep)}
+        case dict() if any(k in x for k in ("pool", "collateral", "资产池")):
+            k = next(k for k in ("pool", "collateral", "资产池") if k in x)
+            return x | {k: f(x[k])}
+        case dict():
+            return {k: f(v) if isinstance(v, dict) else v for k, v in x.items()}
+        case _:
+            raise RuntimeError(f"Failed to match {type(x)}:mkRepLines")
+
+
+def countAssets(x) -> int:
+    match x:
+        case Generic():
+            return countAssets(x.pool)
+        case SPV():
+            return countAssets(x.资产池)
+        case {"assets": list(assets)} | {"清单": list(assets)}:
+            return len(assets)
+        case dict():
+            return sum(countAssets(v) for v in x.values() if isinstance(v, dict))
+        case _:
+            return 0
+
+
+def repLineReport(api, full, repLine, poolAssump=None, sample=5, rateAssump=None, cutoffDate=None, seed=0) -> pd.DataFrame:
+    """ Error of projected pool cashflow of rep lines against full pool, on a sample of scenarios
+
+    for each scenario and field of pool cashflow, total amount of full pool and rep lines and relative error are reported,
+    along with max deviation of pool balance relative to starting balance
+
+    :param api: API to run pools
+    :type api: API
+    :param full: deal or pool with all assets
+    :param repLine: deal or pool built by `mkRepLines` from `full`
+    :param poolAssump: a map of pool assumptions, defaults to None (run without assumption)
+    :type poolAssump: dict, optional
+    :param sample: number of scenarios sampled from `poolAssump`, defaults to 5
+    :type sample: int, optional
+    :param rateAssump: rate assumption, defaults to None
+    :param cutoffDate: cutoff date of pool, defaults to `cutoffDate` of pool or `cutoff` of deal dates
+    :type cutoffDate: str, optional
+    :param seed: seed to sample scenarios, defaults to 0
+    :type seed: int, optional
+    :return: a dataframe with scenario names as index
+    :rtype: pd.DataFrame
+    """
+    def asPool(x):
+        match x:
+            case Generic() | SPV():
+                p = x.pool if isinstance(x, Generic) else x.资产池
+                d = getValWithKs(x.dates if isinstance(x, Generic) else x.日期, ["cutoff", "封包日"])
+                return asPool(p) if (cutoffDate is None and d is None) else tz.assoc(p, "cutoffDate", cutoffDate or d)
+            case dict() if cutoffDate is not None:
+                return tz.assoc(x, "cutoffDate", cutoffDate)
+            case _:
+                return x
+
+    scenarios = {"base": None} if poolAssump is None else poolAssump
+    names = list(scenarios.keys())
+    if len(names) > sample:
+        names = random.Random(seed).sample(names, sample)
+    picked = {k: scenarios[k] for k in names}
+
+    rFull = api.runPoolByScenarios(asPool(full), picked, rateAssump, read=True)
+    rRep = api.runPoolByScenarios(asPool(repLine), picked, rateAssump, read=True)
+    (balField, flowFields) = poolFlowFields[api.lang]
+
+    rows = {}
+    for k in names:
+        for (poolName, (cfFull, _)) in rFull[k].items():
+            (cfRep, _) = rRep[k][poolName]
+            row = {}
+            for fd in flowFields:
+                if fd in cfFull.columns and fd in cfRep.columns:
+                    (a, b) = (cfFull[fd].sum(), cfRep[fd].sum())
+                    row |= {(fd, "full"): a, (fd, "repLine"): b, (fd, "error"): (b-a)/abs(a) if a else 0.0}
+            if balField in cfFull.columns and balField in cfRep.columns and len(cfFull) > 0:
+                (bFull, bRep) = (cfFull[balField].groupby(level=0).last(), cfRep[balField].groupby(level=0).last())
+                idx = bFull.index.union(bRep.index)
+                diff = (bFull.reindex(idx).ffill().fillna(0) - bRep.reindex(idx).ffill().fillna(0)).abs().max()
+                start = bFull.iloc[0] + cfFull.iloc[0].get(flowFields[0], 0)
+                row[(balField, "maxError")] = diff/start if start else 0.0
+            rows[(k, poolName)] = row
+    r = pd.DataFrame.from_dict(rows, orient="index")
+    r.columns = pd.MultiIndex.from_tuples(r.columns)
+    r.index.names = ["scenario", "pool"]
+    r.attrs["assets"] = (countAssets(full), countAssets(repLine))
+    return r
@@ -0,0 +1,142 @@
+import time, random, threading
+from dataclasses import dataclass
+
+
+@dataclass
+class RetryPolicy:
+    """ Resilience policy of requests sent to engine server, all run requests are idempotent so they are safe to resend
+
+    * failed requests (connection error, timeout, 502/503/504) are retried with exponential backoff
+    * an endpoint failing `breakerThreshold` times in a row is skipped for `breakerCooldown` seconds
+    * if `hedgePercentile` is set, a duplicate request is sent to a fallback server once a request is slower than that percentile of observed latency, first response wins
+
+    .. code-block:: python
+
+        api = PickApiFrom([EnginePath.NY_PROD, EnginePath.LDN_PROD], retry=RetryPolicy(retries=5, hedgePercentile=0.95))
+
+    """
+    retries: int = 3
+    """ max number of retries after first attempt """
+    backoff: float = 0.5
+    """ seconds to wait before first retry, doubled on each following retry """
+    maxBackoff: float = 30
+    """ max seconds to wait between retries """
+    breakerThreshold: int = 5
+    """ number of consecutive failures to open the circuit of an endpoint """
+    breakerCooldown: float = 30
+    """ seconds before a request is allowed again to an endpoint with open circuit """
+    hedgePercentile: float = None
+    """ latency percentile (0~1) to send a duplicate request to a fallback server, defaults to None (no hedging) """
+    hedgeMinSamples: int = 20
+    """ min number of observed latencies of an endpoint before hedging """
+    retryStatus: tuple = (502, 503, 504)
+    """ http status codes to be retried """
+
+    def delay(self, attempt: int) -> float:
+        """ seconds to wait before retry number `attempt` (starting from 0), with jitter """
+        return min(self.maxBackoff, self.backoff * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+class CircuitBreaker:
+    """ consecutive failure counter of an endpoint, open after `threshold` failures and half open after `cooldown` seconds """
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.openedAt = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """ True if a request can be sent, a single failure after cooldown will open the circuit again """
+        with self._lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt >= self.cooldown:
+                self.openedAt = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.openedAt = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.openedAt = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return "closed" if self.openedAt is None else "open"
+
+
+@dataclass
+class TimeoutModel:
+    """ Timeout of a request scaled by its size and work, learned from observed latency of each endpoint
+
+    work of a request is roughly number of assets x projection periods x number of scenarios,
+    a fixed cost and a cost per unit of work are fitted by weighted least squares with older observations fading out
+
+    timeout = `overhead` + size/`bandwidth` + `safety` x predicted seconds, bounded by `minTimeout` (`pricingMinTimeout` for a run with pricing) and `maxTimeout`
+    """
+    minTimeout: float = 10
+    """ min timeout in seconds """
+    pricingMinTimeout: float = 30
+    """ min timeout in seconds of a run with pricing """
+    maxTimeout: float = 900
+    """ max timeout in seconds """
+    overhead: float = 2
+    """ seconds added to every request for connection and parsing """
+    bandwidth: float = 5*1024**2
+    """ assumed bytes per second to upload request """
+    safety: float = 5
+    """ multiple of predicted seconds to wait before timeout """
+    priorRate: float = 5e-7
+    """ seconds per unit of work before any observation """
+    memory: int = 50
+    """ number of recent observations effectively kept in the fit """
+    pricingFactor: float = 3
+    """ multiple of work for a run with pricing """
+
+    def __post_init__(self) -> None:
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def predict(self, endpoint: str, work: float) -> float:
+        """ predicted seconds of engine to complete `work` on `endpoint` """
+        s = self.stats.get(endpoint)
+        if s is None or s["sx"] <= 0:
+            return self.priorRate * work
+        w = s["w"]
+        mx, my = s["sx"]/w, s["sy"]/w
+        varX = s["sxx"]/w - mx*mx
+        if s["n"] < 3 or varX <= 1e-9*mx*mx:
+            return s["sy"]/s["sx"] * work
+        rate = (s["sxy"]/w - mx*my)/varX
+        if rate <= 0:
+            return s["sy"]/s["sx"] * work
+        return max(0, my - rate*mx) + rate*work
+
+    def timeout(self, endpoint: str, work: float, size: int = 0, pricing: bool = False) -> float:
+        """ timeout in seconds of a request """
+        t = self.overhead + size/self.bandwidth + self.safety * self.predict(endpoint, work)
+        return min(self.maxTimeout, max(self.pricingMinTimeout if pricing else self.minTimeout, t))
+
+    def observe(self, endpoint: str, work: float, elapsed: float) -> None:
+        """ record seconds spent by a request of `work` on `endpoint` """
+        if work <= 0:
+            return
+        keep = 1 - 1/self.memory
+        with self._lock:
+            s = self.stats.setdefault(endpoint, {"n": 0, "w": 0.0, "sx": 0.0, "sy": 0.0, "sxx": 0.0, "sxy": 0.0})
+            for k in ("w", "sx", "sy", "sxx", "sxy"):
+                s[k] *= keep
+            s["n"] += 1
+            s["w"] += 1
+            s["sx"] += work
+            s["sy"] += elapsed
+            s["sxx"] += work*work
+            s["sxy"] += work*elapsed
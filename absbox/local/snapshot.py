@@ -0,0 +1,240 @@
+import io, json, mmap, pickle, struct, itertools, dataclasses
+from importlib.metadata import version
+
+import numpy as np
+
+from absbox.local.generic import Generic
+from absbox.local.china import SPV
+
+
+MAGIC = b"ABXSNAP1"
+ALIGN = 64
+MIN_ROWS = 64
+""" lists shorter than this are pickled as is """
+
+dealTypes = {"Generic": Generic, "SPV": SPV}
+
+
+class Packed:
+    """ a value saved in packed form, `fn(*args)` rebuilds it when unpickled """
+    def __init__(self, fn, args) -> None:
+        self.fn = fn
+        self.args = args
+
+    def __reduce__(self):
+        return (self.fn, self.args)
+
+
+def numbers(xs: list):
+    """ a list of float/int as an array, None if it has other types or ints out of int64 """
+    ts = set(map(type, xs))
+    try:
+        if ts == {float}:
+            return np.array(xs, dtype=np.float64)
+        if ts == {int}:
+            return np.array(xs, dtype=np.int64)
+    except OverflowError:
+        pass
+    return None
+
+
+class RowEncoder:
+    """ split records of a list (i.e assets of a pool) into columns
+
+    records are grouped by shape (keys of dicts, length of lists), numeric columns of a group become arrays.
+    a dict/list referred by more than one record (e.g a rate spec translated once and shared) is kept as a single value, so it is still shared after loading
+    """
+    def __init__(self, xs: list) -> None:
+        self.shared = set()
+        seen = set()
+        stack = [v for x in xs for v in self.children(x)]
+        while stack:
+            v = stack.pop()
+            if type(v) is dict or type(v) is list:
+                if id(v) in seen:
+                    self.shared.add(id(v))
+                else:
+                    seen.add(id(v))
+                    stack.extend(self.children(v))
+
+    @staticmethod
+    def children(x):
+        match x:
+            case dict():
+                return x.values()
+            case list():
+                return x
+            case _:
+                return ()
+
+    def flatten(self, x, out: list):
+        """ shape of `x`, with its leaf values appended to `out` """
+        t = type(x)
+        if id(x) in self.shared:
+            pass
+        elif t is dict and all(type(k) is str for k in x):
+            return ("d", tuple(x.keys()), tuple([self.flatten(v, out) for v in x.values()]))
+        elif t is list:
+            return ("l", tuple([self.flatten(v, out) for v in x]))
+        out.append(x)
+        return "v"
+
+    def encode(self, xs: list) -> Packed:
+        groups = {}
+        for (i, x) in enumerate(xs):
+            row = []
+            (idx, rows) = groups.setdefault(self.flatten(x, row), ([], []))
+            idx.append(i)
+            rows.append(row)
+        r = []
+        for (sh, (idx, rows)) in groups.items():
+            cols = []
+            for c in zip(*rows):
+                a = numbers(c) if len(c) >= MIN_ROWS else None
+                cols.append(list(c) if a is None else a)
+            r.append((sh, np.array(idx, dtype=np.int64) if len(groups) > 1 else None, len(idx), cols))
+        return Packed(unpackRows, (len(xs), r))
+
+
+def buildColumn(sh, cols, size: int) -> list:
+    """ values of shape `sh` of `size` records, built level by level from leaf columns taken from iterator `cols` """
+    if sh == "v":
+        return next(cols)
+    isDict = sh[0] == "d"
+    children = [buildColumn(s, cols, size) for s in sh[-1]]
+    if not children:
+        return [{} if isDict else [] for _ in range(size)]
+    if isDict:
+        return list(map(dict, map(zip, itertools.repeat(sh[1]), zip(*children))))
+    return list(map(list, zip(*children)))
+
+
+def unpackRows(n: int, groups: list) -> list:
+    r = None if len(groups) == 1 else [None] * n
+    for (sh, idx, size, cols) in groups:
+        rows = buildColumn(sh, (c.tolist() if isinstance(c, np.ndarray) else c for c in cols), size)
+        if r is None:
+            return rows
+        for (i, row) in zip(idx.tolist(), rows):
+            r[i] = row
+    return r if r is not None else []
+
+
+def unpackNumbers(xs) -> list:
+    return xs.tolist()
+
+
+def pack(x, memo: dict):
+    """ replace long lists in `x` by packed form, dicts/lists without long lists are kept as the same object """
+    if id(x) in memo:
+        return memo[id(x)]
+    r = x
+    match x:
+        case list() if len(x) >= MIN_ROWS and all(type(v) is dict or type(v) is list for v in x):
+            r = RowEncoder(x).encode(x)
+        case list() if len(x) >= MIN_ROWS and (a := numbers(x)) is not None:
+            r = Packed(unpackNumbers, (a,))
+        case list() | tuple():
+            vs = [pack(v, memo) for v in x]
+            if any(v is not o for (v, o) in zip(vs, x)):
+                r = type(x)(vs)
+        case dict():
+            vs = {k: pack(v, memo) for (k, v) in x.items()}
+            if any(vs[k] is not v for (k, v) in x.items()):
+                r = vs
+    memo[id(x)] = r
+    return r
+
+
+def saveSnapshot(deal: Generic | SPV, path: str, withJson: bool = True) -> None:
+    """ Save a deal with its translated json to a binary file, to be loaded by `loadSnapshot()` without translating it again
+
+    long lists (i.e assets of a pool) are saved by columns, numeric columns are saved as contiguous arrays.
+    arrays are converted back to python lists when loading, so the deal stays json serializable, memory is not shared between workers
+
+    .. code-block:: python
+
+        saveSnapshot(deal, "deal.snap")      # once, after building the deal
+        deal = loadSnapshot("deal.snap")      # in each worker
+        api.run(deal, ...)
+
+    :param deal: a deal
+    :type deal: Generic | SPV
+    :param path: file path to save
+    :type path: str
+    :param withJson: save translated json of deal, defaults to True
+    :type withJson: bool, optional
+    """
+    dealType = next((k for (k, v) in dealTypes.items() if type(deal) is v), None)
+    if dealType is None:
+        raise RuntimeError(f"Failed to match {type(deal)}:saveSnapshot, only support Generic/SPV")
+    memo = {}
+    fields = {f.name: pack(getattr(deal, f.name), memo) for f in dataclasses.fields(deal)}
+    body = (fields, pack(deal.json, memo) if withJson else None)
+
+    arrays = []
+    def persistent_id(x):
+        if isinstance(x, np.ndarray):
+            arrays.append(np.ascontiguousarray(x))
+            return len(arrays) - 1
+        return None
+    buf = io.BytesIO()
+    p = pickle.Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL)
+    p.persistent_id = persistent_id
+    p.dump(body)
+    objects = buf.getbuffer()
+
+    header = {"absbox": version("absbox"), "deal": dealType, "objects": len(objects)
+              , "arrays": [[a.dtype.str, len(a)] for a in arrays]}
+    headerBytes = json.dumps(header).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack("<Q", len(headerBytes)) + headerBytes)
+        f.write(objects)
+        for a in arrays:
+            f.write(b"\0" * (-f.tell() % ALIGN))
+            f.write(a.data)
+
+
+def loadSnapshot(path: str) -> Generic | SPV:
+    """ Load a deal saved by `saveSnapshot()`, translated json is reused if it was saved by the same version of absbox, otherwise deal is translated again when it runs
+
+    snapshot file is unpickled, which may run arbitrary code: only load files from a trusted source
+
+    :param path: file path of snapshot
+    :type path: str
+    :return: a deal
+    :rtype: Generic | SPV
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Invalid snapshot file:{path}")
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n))
+        start = f.tell()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = []
+    offset = start + header["objects"]
+    for (dtype, size) in header["arrays"]:
+        offset += -offset % ALIGN
+        arrays.append(np.frombuffer(mm, dtype=dtype, count=size, offset=offset))
+        offset += arrays[-1].nbytes
+
+    u = pickle.Unpickler(io.BytesIO(mm[start:start + header["objects"]]))
+    u.persistent_load = arrays.__getitem__
+    (fields, dealJson) = u.load()
+    del u, arrays
+    try:
+        mm.close()
+    except BufferError:
+        # arrays of source kept as is still refer to the file
+        pass
+
+    deal = dealTypes[header["deal"]](**fields)
+    if dealJson is not None and header["absbox"] == version("absbox"):
+        deal.__dict__["json"] = dealJson
+    return deal
+
+
+save_snapshot = saveSnapshot
+load_snapshot = loadSnapshot
@@ -0,0 +1,429 @@
+""" A local stand-in of engine server, for testing and benchmarking the client without network
+
+* replay mode: deals matching a benchmark deal under `benchmark/*/out` get the recorded response under `benchmark/*/resp`,
+  other deals get a synthetic response. benchmark folder is `absbox/tests/benchmark` of a source checkout by default
+* synthetic mode: every deal gets a response of a single pool with `rows` generated rows, paid to a single bond
+* pools get cashflow of their mortgages/loans/installments amortized by level payment, assumptions are ignored
+
+.. code-block:: bash
+
+    python -m absbox.local.standin --port 8081 --mode synthetic --rows 360 --latency 0.05
+
+.. code-block:: python
+
+    with StandInEngine(latency=0.01) as engine:
+        api = API(engine.url, lang='english')
+
+"""
+import os, json, gzip, hashlib, threading, time, glob, argparse, collections
+from datetime import date, timedelta
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from importlib.metadata import version
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BENCHMARK_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests", "benchmark")
+
+
+class UnknownDeal(Exception):
+    """ a deal hash not registered """
+
+
+def dealKey(deal) -> str:
+    """ key of a deal json regardless of key order """
+    return hashlib.sha256(json.dumps(deal, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def loadJson(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def loadBenchmark(folder=BENCHMARK_FOLDER) -> dict:
+    """ map from key of benchmark deal json to path of its recorded response """
+    r = {}
+    for dealFile in glob.glob(os.path.join(folder, "*", "out", "*.json")):
+        respFile = dealFile.replace(f"{os.sep}out{os.sep}", f"{os.sep}resp{os.sep}").replace(".json", ".out.json")
+        if not os.path.exists(respFile):
+            continue
+        r[dealKey(loadJson(dealFile))] = respFile
+    return r
+
+
+def decodeColumn(c: dict, n: int) -> list:
+    if "const" in c:
+        return [c["const"]]*n
+    if "values" in c:
+        return c["values"]
+    return [c["specs"][i] for i in c["codes"]]
+
+
+def decodeColumnarAssets(x: dict) -> list:
+    """ assets encoded by `mkColumnarAssets` in the same form as built by `mkAsset` """
+    r = [None]*sum(g["size"] for g in x["contents"])
+    start = 0
+    for g in x["contents"]:
+        cols = [decodeColumn(c, g["size"]) for c in g["columns"]]
+        record = g["record"] or []
+        records = [dict(zip(record, vs)) for vs in zip(*cols[:len(record)])] if record else None
+        rest = cols[len(record):]
+        rows = g["rows"] if g["rows"] is not None else range(start, start+g["size"])
+        for (j, i) in enumerate(rows):
+            a = {"tag": g["tag"], "contents": ([records[j]] if record else []) + [c[j] for c in rest]}
+            r[i] = a if g["union"] is None else {"tag": g["union"], "contents": a}
+        start += g["size"]
+    return r
+
+
+def decodePool(x: dict) -> dict:
+    """ pool with assets in columns decoded """
+    def decode(p):
+        if isinstance(p, dict) and isinstance(p.get("assets"), dict) and p["assets"].get("tag") == "ColumnarAssets":
+            return p | {"assets": decodeColumnarAssets(p["assets"])}
+        return p
+    match x:
+        case {"tag": "SoloPool", "contents": p}:
+            return x | {"contents": decode(p)}
+        case {"tag": "MultiPool", "contents": ps}:
+            return x | {"contents": {k: decode(p) for k, p in ps.items()}}
+        case {"tag": _, "contents": {"tag": _} as p}:
+            return x | {"contents": decodePool(p)}
+        case _:
+            return x
+
+
+def mkRow(d: date, balance: float, prin: float, interest: float, rate: float) -> dict:
+    return {"tag": "MortgageFlow"
+            , "contents": [d.isoformat(), round(balance, 2), round(prin, 2), round(interest, 2)
+                           , 0, 0, 0, 0, rate, None, None, [0, 0, 0, 0, 0, 0]]}
+
+
+def mkRows(n: int, startDate=date(2021, 1, 31), balance=1e6) -> list:
+    """ `n` rows of mortgage cashflow, monthly """
+    prin = balance / max(n, 1)
+    return [mkRow(startDate + timedelta(days=30*i), balance-prin*(i+1), prin, balance*0.004, 0.05) for i in range(n)]
+
+
+def mkDealResp(rows: list) -> list:
+    """ response of running a deal with pool cashflow `rows`, all cash collected is paid to a single sequential bond """
+    dates = [r["contents"][0] for r in rows]
+    begin = round(rows[0]["contents"][1] + rows[0]["contents"][2], 2) if rows else 0
+    (accStmt, bndStmt, bal) = ([], [], begin)
+    for (d, bal, prin, interest) in (r["contents"][:4] for r in rows):
+        accStmt += [{"tag": "AccTxn", "contents": [d, interest, interest, "<Pool:CollectedInterest>"]}
+                    , {"tag": "AccTxn", "contents": [d, interest+prin, prin, "<Pool:CollectedPrincipal>"]}
+                    , {"tag": "AccTxn", "contents": [d, 0, -(interest+prin), "<PayInt:A1><PayPrin:A1>"]}]
+        bndStmt.append({"tag": "BondTxn", "contents": [d, bal, interest, prin, 0.07, interest+prin, 0, 0
+                                                       , round(bal/begin, 6) if begin else 0, ["<PayInt:A1>", "<PayPrin:A1>"]]})
+    frame = {"tag": "CashFlowFrame", "contents": [[0, "1900-01-01", None], rows]}
+    deal = {"name": "synthetic", "status": {"tag": "Amortizing"}
+            , "dates": {"tag": "PreClosingDates", "contents": ["2021-01-01", "2021-01-15", None, "2060-01-01"
+                                                              , ["2021-01-31", {"tag": "MonthEnd"}], ["2021-02-20", {"tag": "DayOfMonth", "contents": 20}]]}
+            , "accounts": {"acc01": {"accBalance": 0, "accName": "acc01", "accInterest": None, "accType": None, "accStmt": accStmt}}
+            , "fees": {}
+            , "bonds": {"A1": {"tag": "Bond", "bndName": "A1", "bndType": {"tag": "Sequential"}
+                               , "bndOriginInfo": {"originBalance": begin, "originDate": "2021-01-15", "originRate": {"numerator": 7, "denominator": 100}, "maturityDate": None}
+                               , "bndInterestInfo": {"tag": "Fix", "contents": [0.07, "DC_ACT_365F"]}, "bndStepUp": None, "bndBalance": bal, "bndRate": 0.07
+                               , "bndDuePrin": 0, "bndDueInt": 0, "bndDueIntOverInt": 0, "bndDueIntDate": None, "bndLastIntPay": None, "bndLastPrinPay": None
+                               , "bndStmt": bndStmt}}
+            , "pool": {"tag": "SoloPool", "contents": {"assets": [], "futureCf": frame, "asOfDate": "2021-01-01", "issuanceStat": {"IssuanceBalance": begin}
+                                                       , "extendPeriods": {"tag": "MonthEnd"}}}
+            , "waterfall": {"DistributionDay Amortizing": [{"tag": "AccrueAndPayInt", "contents": [None, "acc01", ["A1"], None]}
+                                                           , {"tag": "PayPrin", "contents": [None, "acc01", ["A1"], None]}]}
+            , "collects": [{"tag": "Collect", "contents": [None, "CollectedInterest", "acc01"]}
+                           , {"tag": "Collect", "contents": [None, "CollectedPrincipal", "acc01"]}]
+            } | dict.fromkeys(["call", "liqProvider", "rateSwap", "rateCap", "currencySwap", "custom", "triggers", "overrides", "ledgers"])
+    logs = [{"tag": "EndRun", "contents": [dates[-1] if dates else "2021-01-01", "No Pool Cashflow/All Account is zero/Not revolving"]}]
+    return [{"tag": "MDeal", "contents": deal}, {"PoolConsol": frame}, logs, None]
+
+
+def assetTerms(a) -> tuple | None:
+    """ (current balance, current rate, remaining term) of an asset json, None if it is not supported """
+    match a:
+        case {"tag": "Mortgage" | "PersonalLoan", "contents": [_, bal, rate, term, *_]}:
+            return (bal, rate, term)
+        case {"tag": "Installment", "contents": [_, bal, term, *_]}:
+            return (bal, 0, term)
+        case {"tag": _, "contents": {"tag": _} as x}:
+            # asset in a union of mixed pool
+            return assetTerms(x)
+        case _:
+            return None
+
+
+def mkPoolRows(assets: list, startDate=date(2021, 1, 31)) -> list | None:
+    """ monthly cashflow of assets amortized by level payment, None if no asset is supported """
+    terms = [t for t in map(assetTerms, assets) if t is not None]
+    if not terms:
+        return None
+    (bal, rate, term) = (np.array(xs, dtype=np.float64) for xs in zip(*terms))
+    r = rate / 12
+    rows = []
+    for i in range(int(term.max())):
+        live = term > 0
+        n = np.maximum(term, 1)
+        # share of balance paid in each period, straight line for zero rate
+        annuity = np.divide(r, 1 - (1 + r)**-n, out=1/n, where=r > 0)
+        interest = np.where(live, bal * r, 0)
+        prin = np.where(live, np.minimum(bal, bal * annuity - interest), 0)
+        wac = float((bal * rate).sum() / bal.sum()) if bal.sum() > 0 else 0.0
+        bal = bal - prin
+        term = term - 1
+        rows.append(mkRow(startDate + timedelta(days=30*i), bal.sum(), prin.sum(), interest.sum(), wac))
+    return rows
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, code: int, body: bytes) -> None:
+        hdrs = {"Content-Type": "application/json"}
+        if self.server.compressResponse and len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            hdrs["Content-Encoding"] = "gzip"
+        self.send_response(code)
+        for k, v in hdrs.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code: int, msg: str) -> None:
+        self._reply(code, json.dumps({"error": msg}).encode('utf-8'))
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/version":
+            self._reply(200, json.dumps({"_version": self.server.version
+                                         , "_capabilities": list(self.server.capabilities)}).encode('utf-8'))
+        else:
+            self._error(404, f"Unknown path {self.path}")
+
+    def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            n = int(self.rfile.readline().split(b";")[0], 16)
+            if n == 0:
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(n))
+            self.rfile.readline()
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            self.server.chunked += 1
+            raw = self._read_chunked()
+        else:
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        match self.headers.get("Content-Encoding"):
+            case "gzip":
+                return gzip.decompress(raw)
+            case "zstd":
+                return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+            case _:
+                return raw
+
+    def do_POST(self) -> None:
+        try:
+            raw = self._body()
+        except Exception as e:
+            return self._error(400, f"Failed to decode request body:{e}")
+        self.server.log.append((self.path, len(raw)))
+        path = self.path.rstrip("/")
+        if path == "/registerDeal":
+            return self._reply(200, json.dumps({"hash": self.server.register(raw)}).encode('utf-8'))
+        route = self.server.routes.get(path)
+        if route is None:
+            return self._error(404, f"Unknown path {self.path}")
+        fault = self.server.nextFault()
+        if fault is not None:
+            return self._error(fault, f"Injected fault {fault}")
+        with self.server.running():
+            try:
+                body, n = route(json.loads(raw))
+            except UnknownDeal as e:
+                return self._error(410, f"Unknown deal {e}")
+            except Exception as e:
+                return self._error(500, f"Failed to process request:{e}")
+            time.sleep(self.server.latency + self.server.latencyPerScenario * n)
+        self._reply(200, body)
+
+
+class StandInEngine(ThreadingHTTPServer):
+    """ Stand-in of engine server serving `/version` `/registerDeal` `/runDeal` `/runDealByScenarios` `/runMultiDeals`
+    `/runPool` `/runPoolByScenarios` `/runAsset`, pools with assets in columns are decoded
+
+    :param mode: 'replay' or 'synthetic', defaults to 'replay'
+    :param rows: number of rows of pool cashflow in synthetic responses, defaults to 120
+    :param latency: seconds to wait before each response, defaults to 0
+    :param latencyPerScenario: extra seconds to wait per scenario/deal in a request, defaults to 0
+    :param capabilities: features declared in `/version`, defaults to all supported ones
+    :param benchmark: folder of recorded responses in replay mode, defaults to `absbox/tests/benchmark`
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, mode="replay", rows=120, latency=0.0, latencyPerScenario=0.0
+                 , capabilities=None, compressResponse=True, engineVersion=None, benchmark=BENCHMARK_FOLDER) -> None:
+        super().__init__((host, port), StandInHandler)
+        if mode not in ("replay", "synthetic"):
+            raise ValueError(f"Invalid mode:{mode}, only support 'replay' or 'synthetic'")
+        self.mode = mode
+        self.rows = rows
+        self.latency = latency
+        self.latencyPerScenario = latencyPerScenario
+        self.compressResponse = compressResponse
+        self.version = engineVersion or version("absbox")
+        self.capabilities = capabilities if capabilities is not None else \
+            ["gzip", "registerDeal", "columnarPool", "chunkedUpload"] + (["zstd"] if zstandard else [])
+        self.deals = {}
+        """ registered deals by hash """
+        self.log = []
+        """ (path, request size) of received requests """
+        self.chunked = 0
+        """ number of requests received in chunked transfer encoding """
+        self.faults = collections.deque()
+        """ status codes to reply to the next run requests instead of running them """
+        self.inflight = 0
+        self.peak = 0
+        """ max number of run requests being processed at the same time """
+        self.benchmark = loadBenchmark(benchmark) if mode == "replay" else {}
+        self._resps = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.routes = {"/runDeal": self.runDeal
+                       , "/runDealByScenarios": self.runDealByScenarios
+                       , "/runMultiDeals": self.runMultiDeals
+                       , "/runPool": self.runPool
+                       , "/runPoolByScenarios": self.runPoolByScenarios
+                       , "/runAsset": self.runAsset}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """ serve in a background thread """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def nextFault(self) -> int | None:
+        with self._lock:
+            return self.faults.popleft() if self.faults else None
+
+    @contextmanager
+    def running(self):
+        """ count a run request in flight """
+        with self._lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def register(self, raw: bytes) -> str:
+        h = hashlib.sha256(raw).hexdigest()
+        self.deals[h] = json.loads(raw)
+        return h
+
+    def _cached(self, k, build) -> bytes:
+        with self._lock:
+            if k not in self._resps:
+                self._resps[k] = json.dumps(build(), ensure_ascii=False).encode('utf-8')
+            return self._resps[k]
+
+    def dealResp(self, deal) -> bytes:
+        """ response of a deal as json bytes """
+        if deal.get("tag") == "DealRef":
+            if deal["contents"] not in self.deals:
+                raise UnknownDeal(deal["contents"])
+            deal = self.deals[deal["contents"]]
+        if isinstance(deal.get("contents"), dict) and "pool" in deal["contents"]:
+            deal = deal | {"contents": deal["contents"] | {"pool": decodePool(deal["contents"]["pool"])}}
+        respFile = self.benchmark.get(dealKey(deal)) if self.mode == "replay" else None
+        if respFile is None:
+            return self._cached("synthetic", lambda: mkDealResp(mkRows(self.rows)))
+        return self._cached(respFile, lambda: loadJson(respFile))
+
+    def poolResp(self, pool) -> bytes:
+        """ cashflow of each pool, or `rows` generated rows if none of the assets is supported """
+        def flow(p):
+            rows = mkPoolRows(p.get("assets", []) if isinstance(p, dict) else []) or mkRows(self.rows)
+            return [{"tag": "CashFlowFrame", "contents": [[0, "1900-01-01", None], rows]}, {}]
+        def flows(x):
+            match x:
+                case {"tag": "MultiPool", "contents": ps}:
+                    return {k: flow(p) for k, p in ps.items()}
+                case {"tag": "SoloPool", "contents": p}:
+                    return {"PoolConsol": flow(p)}
+                case {"tag": _, "contents": {"tag": _} as p}:
+                    return flows(p)
+                case _:
+                    return {"PoolConsol": flow(None)}
+        return json.dumps(flows(decodePool(pool)), ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def joinMap(m: dict) -> bytes:
+        """ json object from values already dumped """
+        return b"{" + b",".join(json.dumps(k, ensure_ascii=False).encode('utf-8') + b":" + v for k, v in m.items()) + b"}"
+
+    def runDeal(self, req) -> tuple:
+        return (self.dealResp(req['contents'][0]), 1)
+
+    def runDealByScenarios(self, req) -> tuple:
+        (deal, assumps, _) = req['contents']
+        resp = self.dealResp(deal)
+        return (self.joinMap({k: resp for k in assumps}), len(assumps))
+
+    def runMultiDeals(self, req) -> tuple:
+        deals = req['contents'][0]
+        return (self.joinMap({k: self.dealResp(d) for k, d in deals.items()}), len(deals))
+
+    def runPool(self, req) -> tuple:
+        return (self.poolResp(req['contents'][0]), 1)
+
+    def runPoolByScenarios(self, req) -> tuple:
+        assumps = req['contents'][1]
+        resp = self.poolResp(req['contents'][0])
+        return (self.joinMap({k: resp for k in assumps}), len(assumps))
+
+    def runAsset(self, req) -> tuple:
+        flow = self._cached("asset", lambda: [[{"tag": "CashFlowFrame", "contents": [[0, "1900-01-01", None], mkRows(self.rows)]}, {}], None])
+        return (flow, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="stand-in engine server for absbox")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--mode", default="replay", choices=["replay", "synthetic"])
+    parser.add_argument("--rows", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latencyPerScenario", type=float, default=0.0)
+    parser.add_argument("--benchmark", default=BENCHMARK_FOLDER)
+    args = parser.parse_args()
+    engine = StandInEngine(args.host, args.port, args.mode, args.rows, args.latency, args.latencyPerScenario, benchmark=args.benchmark)
+    print(f"Stand-in engine serving at {engine.url}, mode={args.mode}")
+    engine.serve_forever()
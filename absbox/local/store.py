@@ -0,0 +1,173 @@
+import os, pickle, hashlib, threading, itertools, logging
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import pandas as pd
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class Leaf(NamedTuple):
+    """ a value saved in a file of scenario folder """
+    file: str
+    kind: str
+    """ 'parquet', 'feather' or 'pickle' """
+    index: tuple = ()
+    """ index names of a dataframe saved in feather, index is saved as leading columns """
+    objects: tuple = ()
+    """ columns of object dtype, which may be narrowed by the format """
+
+
+class LazyResult(Mapping):
+    """ read-only view of a result saved in :class:`ResultStore`, a value is loaded from disk when it is accessed """
+    def __init__(self, folder: str, skeleton: dict) -> None:
+        self._folder = folder
+        self._skeleton = skeleton
+
+    def __getitem__(self, k):
+        v = self._skeleton[k]
+        if isinstance(v, dict):
+            return LazyResult(self._folder, v)
+        if isinstance(v, Leaf):
+            return loadLeaf(self._folder, v)
+        return v
+
+    def __iter__(self):
+        return iter(self._skeleton)
+
+    def __len__(self) -> int:
+        return len(self._skeleton)
+
+    def __repr__(self) -> str:
+        return f"LazyResult({list(self._skeleton.keys())})"
+
+    def load(self) -> dict:
+        """ load all values into a dict """
+        return {k: v.load() if isinstance(v, LazyResult) else v for k, v in self.items()}
+
+
+def loadLeaf(folder: str, leaf: Leaf):
+    f = os.path.join(folder, leaf.file)
+    match leaf.kind:
+        case "parquet":
+            return pd.read_parquet(f).astype({c: object for c in leaf.objects})
+        case "feather":
+            df = pd.read_feather(f)
+            df = df.set_index(list(df.columns[:len(leaf.index)])).astype({c: object for c in leaf.objects})
+            df.index.names = list(leaf.index)
+            return df
+        case "pickle":
+            with open(f, 'rb') as fh:
+                return pickle.load(fh)
+
+
+@dataclass(eq=False)
+class ResultStore(Mapping):
+    """ Save results of scenarios to disk as they arrive, dataframes are saved in `format` (requires `pyarrow` for parquet/feather)
+
+    a result is read back lazily: only the dataframe being accessed is loaded.
+    results are saved one by one as they are read, raw response of a run is parsed in full before saving unless it is streamed (requires `ijson`)
+
+    .. code-block:: python
+
+        store = api.runByScenarios(deal, poolAssump=scenarios, store=ResultStore("./sweep"))
+        store["stress"]["bonds"]["A1"]      # only this dataframe is loaded
+        store["stress"].load()              # whole result of a scenario
+
+    """
+    path: str
+    """ folder to save results """
+    format: str = "parquet"
+    """ file format of dataframes, 'parquet', 'feather' or 'pickle' """
+
+    def __post_init__(self) -> None:
+        if self.format not in ("parquet", "feather", "pickle"):
+            raise ValueError(f"Invalid format:{self.format}, only support 'parquet', 'feather' or 'pickle'")
+        if self.format != "pickle" and pyarrow is None:
+            raise ImportError(f"Package `pyarrow` is required for {self.format} format, pls install by: pip install pyarrow")
+        self.path = os.path.expanduser(self.path)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._seq = {}
+        entries = []
+        for e in os.scandir(self.path):
+            m = os.path.join(e.path, "_skeleton.pkl")
+            if e.is_dir() and os.path.exists(m):
+                with open(m, 'rb') as fh:
+                    (seq, name, _) = pickle.load(fh)
+                entries.append((seq, name, e.path))
+        for (_, name, folder) in sorted(entries, key=lambda x: x[0]):
+            self._index[name] = folder
+            self._seq[name] = len(self._seq)
+
+    def _folder(self, name) -> str:
+        return os.path.join(self.path, hashlib.sha1(repr(name).encode('utf-8')).hexdigest())
+
+    def _saveLeaf(self, folder: str, v, n: int):
+        if not isinstance(v, pd.DataFrame):
+            if v is None or isinstance(v, (str, int, float, bool)):
+                return v
+            leaf = Leaf(f"{n}.pkl", "pickle")
+            with open(os.path.join(folder, leaf.file), 'wb') as fh:
+                pickle.dump(v, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            return leaf
+        objects = tuple(c for c, t in v.dtypes.items() if t == object)
+        try:
+            match self.format:
+                case "parquet":
+                    leaf = Leaf(f"{n}.parquet", "parquet", (), objects)
+                    v.to_parquet(os.path.join(folder, leaf.file))
+                    return leaf
+                case "feather":
+                    leaf = Leaf(f"{n}.feather", "feather", tuple(v.index.names), objects)
+                    v.reset_index().to_feather(os.path.join(folder, leaf.file))
+                    return leaf
+        except ImportError:
+            # no engine for the format
+            pass
+        except (ValueError, TypeError) as e:
+            # frames not supported by the format, e.g columns of mixed types
+            logging.warning(f"Failed to save dataframe {n} of {folder} in {self.format}, saved in pickle instead:{e}")
+        leaf = Leaf(f"{n}.pkl", "pickle")
+        v.to_pickle(os.path.join(folder, leaf.file))
+        return leaf
+
+    def put(self, name, result: dict) -> None:
+        """ save result of a scenario, replacing existing one with same name """
+        folder = self._folder(name)
+        os.makedirs(folder, exist_ok=True)
+        counter = itertools.count()
+
+        def save(x):
+            if isinstance(x, dict):
+                return {k: save(v) for k, v in x.items()}
+            return self._saveLeaf(folder, x, next(counter))
+
+        skeleton = save(result)
+        with self._lock:
+            seq = self._seq.setdefault(name, len(self._seq))
+            with open(os.path.join(folder, "_skeleton.pkl"), 'wb') as fh:
+                pickle.dump((seq, name, skeleton), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            self._index[name] = folder
+
+    def __getitem__(self, name):
+        """ a :class:`LazyResult` if the result is a dict (read results), otherwise the value loaded """
+        folder = self._index[name]
+        with open(os.path.join(folder, "_skeleton.pkl"), 'rb') as fh:
+            (_, _, skeleton) = pickle.load(fh)
+        if isinstance(skeleton, dict):
+            return LazyResult(folder, skeleton)
+        return loadLeaf(folder, skeleton) if isinstance(skeleton, Leaf) else skeleton
+
+    def __contains__(self, name) -> bool:
+        return name in self._index
+
+    def __iter__(self):
+        return iter(list(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
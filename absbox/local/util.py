@@ -5,6 +5,7 @@ from absbox.local.base import *
 from datetime import datetime
 from lenses import lens,ui, optics
 import toolz as tz
+from absbox.validation import getValidationMode
 
 
 def mapNone(x, v):
@@ -32,6 +33,106 @@ def mkTag(x: tuple | str) -> dict:
             return {"tag": tagName}
 
 
+def freeze(x):
+    """ hashable form of a json-like value, keeping types apart (`1`/`1.0`/`True`, list/tuple) as they may translate differently """
+    t = type(x)
+    if t is str or t is int or t is float or t is bool or x is None:
+        return (t, x)
+    if t is dict or isinstance(x, dict):
+        return (dict, tuple([(k, freeze(v)) for k, v in x.items()]))
+    if t is list or t is tuple or isinstance(x, (list, tuple)):
+        return (t, tuple([freeze(v) for v in x]))
+    return (t, x)
+
+
+def freezeSeq(x):
+    """ hashable form of a json-like value same as `freeze`, except lists and tuples are not kept apart,
+    for inputs only matched by sequence patterns, i.e formulas """
+    t = type(x)
+    if t is str or t is int or t is float or t is bool or x is None:
+        return (t, x)
+    if t is tuple or t is list or isinstance(x, (list, tuple)):
+        return (tuple, tuple([freezeSeq(v) for v in x]))
+    if t is dict or isinstance(x, dict):
+        return (dict, tuple([(k, freezeSeq(v)) for k, v in x.items()]))
+    return (t, x)
+
+
+def memoize(maxsize: int = 4096, key=freeze):
+    """ cache results of a translation function of one argument by frozen form of the argument (by `key`),
+    same input is translated once and the result is shared by reference, callers must not mutate it.
+    results translated without checks in `trusted` validation mode are not reused in other modes.
+    cache is dropped once it holds `maxsize` results, arguments not hashable are translated as usual """
+    def decorator(fn):
+        cache = {}
+
+        @functools.wraps(fn)
+        def wrapper(x):
+            try:
+                k = (key(x), getValidationMode() == "trusted")
+                r = cache.get(k, cache)
+            except TypeError:
+                return fn(x)
+            if r is cache:
+                if len(cache) >= maxsize:
+                    cache.clear()
+                r = cache[k] = fn(x)
+            return r
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_len = lambda: len(cache)
+        return wrapper
+    return decorator
+
+
+def sameDep(a, b) -> bool:
+    """ same object, or equal scalars of same type """
+    return a is b or (type(a) is type(b) and isinstance(a, (str, int, float, bool)) and a == b)
+
+
+class DealParts:
+    """ translations of fields of a deal, each kept with the objects it was built from (`deps`) and reused while they are the same objects (or equal scalars).
+    a deal owns its store, variants made by `setDealsBy()` `prodDealsBy()` `mkDealsBy()` share the store of the base deal,
+    so fields not changed are translated once and shared by reference. `maxsize` recent translations are kept for each field.
+    a store is not carried by `pickle`/`copy`, the copy starts empty """
+    def __init__(self, maxsize=8) -> None:
+        self.maxsize = maxsize
+        self.entries = {}
+
+    def get(self, name, deps: tuple, build):
+        """ translation of field `name` from `deps`, built by `build()` if no recent translation is from same `deps` """
+        xs = self.entries.get(name, [])
+        for (_deps, r) in xs:
+            if all(map(sameDep, _deps, deps)):
+                return r
+        r = build()
+        self.entries[name] = [(deps, r)] + xs[:self.maxsize-1]
+        return r
+
+    def clear(self) -> None:
+        self.entries = {}
+
+    def __reduce__(self):
+        return (DealParts, (self.maxsize,))
+
+
+def dealParts(deal) -> DealParts:
+    """ store of field translations owned by `deal`
+
+    :meta private:
+    """
+    return deal.__dict__.setdefault("_parts", DealParts())
+
+
+def shareParts(variant, base):
+    """ let `variant` made from `base` reuse translations of fields it shares with `base`, return `variant`
+
+    :meta private:
+    """
+    if variant is not base and hasattr(type(variant), "json") and hasattr(type(base), "json"):
+        variant.__dict__["_parts"] = dealParts(base)
+    return variant
+
+
 def filter_by_tags(xs: list, tags: list) -> list:
     ''' fiter a list of maps by tags'''
     tags_set = set(tags)
@@ -290,6 +391,16 @@ def guess_pool_flow_header(x, l):
             raise RuntimeError(f"Failed to match pool header with {x['tag']},{len(x['contents'])},{l}")
 
 
+translatedPoolTypes = {"Mortgage": "MPool", "AdjustRateMortgage": "MPool", "PersonalLoan": "LPool", "Installment": "IPool"
+                       , "RegularLease": "RPool", "StepUpLease": "RPool", "FixedAsset": "FPool", "Invoice": "VPool"
+                       , "ProjectedFlowFixed": "PPool", "ProjectedFlowMixFloater": "PPool"}
+""" pool type of assets translated already """
+
+translatedRemainTerm = {"Mortgage": 3, "AdjustRateMortgage": 4, "PersonalLoan": 3, "Installment": 2
+                        , "RegularLease": 2, "StepUpLease": 3}
+""" position of remaining term in contents of assets translated already """
+
+
 def inferPoolTypeFromAst(x:dict) -> str:
     match x:
         case {"assets":[["Mortgage",*fields],*ast]} | {"assets":[["AdjustRateMortgage",*fields],*ast]} | {'清单': [['按揭贷款', *fields], *ast]}:
@@ -306,11 +417,30 @@ def inferPoolTypeFromAst(x:dict) -> str:
             return "VPool"
         case {"assets":[["ProjectedFlowMix",*fields],*ast]} | {"assets":[["ProjectedFlowFix",*fields],*ast]} :
             return "PPool"
+        case {"assets":[{"tag":tag},*ast]} | {'清单':[{"tag":tag},*ast]} if tag in translatedPoolTypes:
+            return translatedPoolTypes[tag]
         case _:
             raise RuntimeError(f"Failed to find pool type from assets:{x}")
     
 
 
+def estimatePoolWork(pool, sampleSize=100, defaultTerm=120) -> int:
+    """ estimate projection work of a pool: number of assets times max remaining term of sampled assets """
+    match pool:
+        case {"assets": list(assets)} | {"清单": list(assets)}:
+            sample = assets[::max(1, len(assets)//sampleSize)]
+            terms = [v for ast in sample if isinstance(ast, (list, tuple))
+                       for m in ast if isinstance(m, dict)
+                       for k, v in m.items() if k in ("remainTerm", "剩余期限") and isinstance(v, int)]
+            terms += [ast['contents'][translatedRemainTerm[ast['tag']]] for ast in sample
+                      if isinstance(ast, dict) and ast.get('tag') in translatedRemainTerm]
+            return len(assets) * max(terms, default=defaultTerm)
+        case dict():
+            return sum(estimatePoolWork(v, sampleSize, defaultTerm) for v in pool.values() if isinstance(v, dict))
+        case _:
+            return 0
+
+
 def uplift_m_list(l: list):
     """ input a list of dictionary, reduce the maps into a big map """
     return {k: v for m in l for k, v in m.items()}
@@ -426,10 +556,17 @@ def isMixedDeal(x: dict) -> bool:
         return False
     if 'deals' in x:
         return False
-    assetTags = x & lens.Values().Each()[1][0][0].collect()
-    if len(set(assetTags)) > 1:
-        return True
-    return False
+    def poolType(p):
+        assets = getValWithKs(p, ['assets', '清单'], defaultReturn=[]) if isinstance(p, dict) else []
+        if not assets:
+            return None
+        try:
+            return inferPoolTypeFromAst({"assets": assets[:1]})
+        except RuntimeError:
+            # asset types without a pool type, i.e translated into union already
+            return assets[0]["tag"] if isinstance(assets[0], dict) else assets[0][0]
+    poolTypes = {poolType(p) for p in x.values()} - {None}
+    return len(poolTypes) > 1
 
 
 def strFromPath(xs: list) -> str:
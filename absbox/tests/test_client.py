@@ -0,0 +1,403 @@
+import os, json, importlib, dataclasses, copy, asyncio, time, threading, gc
+
+import pytest
+import pandas as pd
+from lenses import lens
+
+from absbox import API, AsyncAPI, ClusterAPI, PickApiFrom, RetryPolicy, TimeoutModel, ResultCache, ResultStore, mkRepLines, repLineReport, prodDealsBy, saveSnapshot, loadSnapshot
+from absbox.client import AbsboxError, EngineError, estimateDealWork, mkMultiDealReq, dumpDeal
+from absbox.local.component import mkPoolFromFrame
+from absbox.local.jsonstream import JsonBody
+from absbox.local.instrument import Profiler, profiled, phase, carry
+from absbox.local.standin import StandInEngine, loadJson
+
+
+test_folder = os.path.join(os.path.dirname(__file__))
+
+
+def load_deal(country, test_py, name):
+    spec = importlib.util.spec_from_file_location("runner", os.path.join(test_folder, "benchmark", country, test_py))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    with StandInEngine() as e:
+        yield e
+
+
+@pytest.fixture(scope="module")
+def deal():
+    return load_deal("us", "test01.py", "test01")
+
+
+def test_run_replay(engine, deal):
+    api = API(engine.url, lang='english')
+    r = api.run(deal, read=False, showWarning=False)
+    assert r == loadJson(os.path.join(test_folder, "benchmark", "us", "resp", "test01.out.json"))
+
+
+def test_run_by_scenarios_stream(engine, deal):
+    api = API(engine.url, lang='english')
+    scenarios = {f"s{i}": None for i in range(5)}
+    r = api.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False)
+    rs = api.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False, stream=True)
+    assert list(rs.keys()) == list(scenarios.keys())
+    assert r == rs
+
+
+def test_compress_request(engine, deal):
+    api = API(engine.url, lang='english', compress='gzip', compressThreshold=0)
+    assert api.run(deal, read=False, showWarning=False) == API(engine.url, lang='english').run(deal, read=False, showWarning=False)
+
+
+def test_register_deal(engine, deal):
+    api = API(engine.url, lang='english', dealRef=True)
+    api.run(deal, read=False, showWarning=False)
+    api.run(deal, read=False, showWarning=False)
+    assert [p for (p, _) in engine.log[-3:]] == ["/registerDeal", "/runDeal", "/runDeal"]
+    assert api.timeoutModel.stats["/registerDeal"]["sx"] == estimateDealWork(deal)
+    engine.deals.clear()
+    api.run(deal, read=False, showWarning=False)
+    assert [p for (p, _) in engine.log[-3:]] == ["/runDeal", "/registerDeal", "/runDeal"]
+
+
+def test_register_deal_cached(deal, tmp_path):
+    with StandInEngine() as e:
+        r = API(e.url, lang='english', dealRef=True, cache=ResultCache(str(tmp_path))).run(deal, read=False, showWarning=False)
+        api = API(e.url, lang='english', dealRef=True, cache=ResultCache(str(tmp_path)))
+        assert api.run(deal, read=False, showWarning=False) == r
+        assert [p for (p, _) in e.log] == ["/registerDeal", "/runDeal"]
+        # a 410 of a request without deal reference is an error of engine
+        e.faults.append(410)
+        with pytest.raises(EngineError):
+            API(e.url, lang='english').run(deal, read=False, showWarning=False)
+
+
+def test_result_cache(engine, deal, tmp_path):
+    api = API(engine.url, lang='english', cache=ResultCache(str(tmp_path)))
+    r = api.run(deal, read=False, showWarning=False)
+    n = len(engine.log)
+    assert api.run(deal, read=False, showWarning=False) == r
+    assert len(engine.log) == n
+    assert api.cache.stats()['hits'] == 1
+
+
+def test_run_structs_chunks(engine, deal):
+    api = API(engine.url, lang='english')
+    deals = {f"d{i}": deal for i in range(5)}
+    assert api.runStructs(deals, read=False, chunkSize=2, workers=2) == api.runStructs(deals, read=False)
+
+
+def test_multi_deal_req(deal):
+    d = dataclasses.replace(deal, name='"contents": [null')
+    req = json.loads(mkMultiDealReq({"a": dumpDeal(d), '"b"': dumpDeal(deal)}, None, []))
+    assert req == {"tag": "MultiDealRunReq", "contents": [{"a": json.loads(dumpDeal(d)), '"b"': json.loads(dumpDeal(deal))}, None, []]}
+
+
+def test_iter_by_scenarios(engine, deal):
+    api = API(engine.url, lang='english')
+    scenarios = {f"s{i}": None for i in range(7)}
+    r = dict(api.iterByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False, batchSize=3, workers=2))
+    assert r == api.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False)
+    aapi = AsyncAPI(engine.url, lang='english', concurrency=2)
+    assert dict(aapi.iterByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False, batchSize=3, workers=2)) == r
+    pool = deal.pool | {"cutoffDate": "2021-03-01"}
+    assert dict(aapi.iterPoolByScenarios(pool, scenarios, read=False, batchSize=3)) == api.runPoolByScenarios(pool, scenarios, read=False)
+    aapi.close()
+
+
+def test_result_store(engine, deal, tmp_path):
+    api = API(engine.url, lang='english')
+    scenarios = {f"s{i}": None for i in range(3)}
+    r = api.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False)
+    store = api.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False
+                               , store=ResultStore(str(tmp_path), format="pickle"))
+    store.put("s0", r["s0"])
+    assert list(ResultStore(str(tmp_path), format="pickle")) == list(scenarios.keys())
+    assert store["s1"] == r["s1"]
+
+
+def test_result_store_fallback(tmp_path, caplog):
+    pytest.importorskip("pyarrow")
+    store = ResultStore(str(tmp_path))
+    store.put("s", {"numbers": pd.DataFrame({"a": [1.0]}), "mixed": pd.DataFrame({"a": ["x", 1.0]})})
+    assert "saved in pickle" in caplog.text
+    assert store["s"]["mixed"]["a"].tolist() == ["x", 1.0]
+    assert store["s"]["numbers"].equals(pd.DataFrame({"a": [1.0]}))
+
+
+def test_columnar_pool(engine, deal):
+    api = API(engine.url, lang='english')
+    assert '"ColumnarAssets"' in str(api.build_run_deal_req("Single", deal))
+    assert api.run(deal, read=False, showWarning=False) == API(engine.url, lang='english', columnar=False).run(deal, read=False, showWarning=False)
+
+
+def test_rep_line_report(engine, deal):
+    api = API(engine.url, lang='english')
+    (origin, current) = deal.pool["assets"][0][1:]
+    assets = [["Mortgage", origin | {"originBalance": b, "originTerm": ot}, current | {"currentBalance": b, "currentRate": cr, "remainTerm": rt}]
+              for (b, ot, cr, rt) in [(1000, 30, 0.079, 20), (3000, 30, 0.080, 22), (500, 30, 0.0806, 19)
+                                      , (2000, 40, 0.060, 30), (800, 40, 0.0595, 35)]]
+    full = dataclasses.replace(deal, pool={"assets": assets})
+    rep = mkRepLines(full)
+    assert len(rep.pool["assets"]) == 2
+    assert sum(a[2]["currentBalance"] for a in rep.pool["assets"]) == sum(a[2]["currentBalance"] for a in assets)
+    r = repLineReport(api, full, rep, poolAssump={f"s{i}": None for i in range(4)}, sample=2)
+    assert len(r) == 2 and r.attrs["assets"] == (5, 2)
+    assert r[("Principal", "full")].tolist() == pytest.approx([7300]*2, abs=1)
+    assert (r[("Principal", "error")].abs() < 1e-4).all()
+    assert (r[("Interest", "error")].abs() < 0.02).all() and (r[("Interest", "error")] != 0).all()
+    assert ((0 < r[("Balance", "maxError")]) & (r[("Balance", "maxError")] < 0.05)).all()
+
+
+@pytest.mark.parametrize("compress", [None, "gzip"])
+def test_chunked_upload(engine, deal, compress):
+    api = API(engine.url, lang='english', chunkedUpload=256, compress=compress, compressThreshold=0)
+    req = api.build_run_deal_req("Single", deal)
+    assert req.estimate() == len(str(req).encode('utf-8'))
+    assert b"".join(req) == str(req).encode('utf-8') == API(engine.url, lang='english', chunkedUpload=None).build_run_deal_req("Single", deal).encode('utf-8')
+    n = engine.chunked
+    assert api.run(deal, read=False, showWarning=False) == API(engine.url, lang='english', chunkedUpload=None).run(deal, read=False, showWarning=False)
+    assert engine.chunked == n + 1
+
+
+def test_translate_deal_parts(deal):
+    bal = deal.bonds[0][1]["balance"]
+    (d1, d2) = prodDealsBy(deal, (lens.bonds[0][1]["balance"], [bal/2, bal/4])).values()
+    assert d1.json["contents"]["pool"] is d2.json["contents"]["pool"] is deal.json["contents"]["pool"]
+    assert d1.json["contents"]["bonds"] != d2.json["contents"]["bonds"]
+    d3 = dataclasses.replace(deal, pool=dict(deal.pool))
+    assets = d3.json["contents"]["pool"]["contents"]["assets"]
+    d3.pool["assets"] = d3.pool["assets"] * 2
+    d3.invalidate()
+    assert len(d3.json["contents"]["pool"]["contents"]["assets"]) == 2 * len(assets)
+
+
+def test_translate_replaced_deal(deal):
+    d = copy.deepcopy(deal)
+    assert d.json["contents"]["bonds"]["A1"]["bndBalance"] == 1000
+    d.bonds[0][1]["balance"] = 1
+    assert dataclasses.replace(d).json["contents"]["bonds"]["A1"]["bndBalance"] == 1
+
+
+def test_snapshot(engine, deal, tmp_path):
+    d = dataclasses.replace(deal, pool=deal.pool | {"assets": deal.pool["assets"] * 100})
+    saveSnapshot(d, str(tmp_path / "deal.snap"))
+    d2 = loadSnapshot(str(tmp_path / "deal.snap"))
+    assert "json" in d2.__dict__
+    assert d2 == d and d2.json == d.json
+    api = API(engine.url, lang='english')
+    assert api.run(d2, read=False, showWarning=False) == api.run(d, read=False, showWarning=False)
+
+
+def test_translate_multi_pool_from_frame(deal):
+    tape = pd.DataFrame({"originBalance": [2200.0, 1500.0], "originRate": [0.045, 0.05], "originTerm": [30, 24], "freq": ["Monthly"]*2
+                         , "type": ["Level", "Even"], "originDate": ["2021-02-01"]*2, "currentBalance": [2200.0, 1400.0]
+                         , "currentRate": [0.08, 0.05], "remainTerm": [20, 10], "status": ["Current"]*2})
+    mixed = dataclasses.replace(deal, pool={"A": {"assets": mkPoolFromFrame(tape, "Mortgage")}, "B": {"assets": mkPoolFromFrame(tape, "Loan")}})
+    pools = mixed.json["contents"]["pool"]
+    assert pools["tag"] == "MultiPool"
+    assert [a["tag"] for p in pools["contents"].values() for a in p["assets"]] == ["MO", "MO", "LO", "LO"]
+    single = dataclasses.replace(deal, pool={"A": {"assets": mkPoolFromFrame(tape, "Mortgage")}, "B": {"assets": mkPoolFromFrame(tape, "Mortgage")}})
+    assert {a["tag"] for p in single.json["contents"]["pool"]["contents"].values() for a in p["assets"]} == {"Mortgage"}
+
+
+def test_cluster_work(engine, deal):
+    with StandInEngine() as other:
+        capi = ClusterAPI([engine.url, other.url], lang='english')
+        scenarios = {f"s{i}": None for i in range(4)}
+        r = capi.runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False)
+        assert r == API(engine.url, lang='english').runByScenarios(deal, poolAssump=scenarios, read=False, showWarning=False)
+        for api in capi.apis:
+            assert api.timeoutModel.stats["/runDealByScenarios"]["sx"] == estimateDealWork(deal) * 2
+
+
+def test_failover(deal):
+    with StandInEngine() as full, StandInEngine(capabilities=[]) as bare:
+        api = PickApiFrom([full.url, bare.url], lang='english', compress='gzip', compressThreshold=0, chunkedUpload=256)
+        (primary, fallback) = (full, bare) if api.url == full.url else (bare, full)
+        picked = PickApiFrom([full.url, bare.url], lang='english', fallbacks=[full.url, bare.url, "http://localhost:1"])
+        assert sorted([picked.url] + picked.fallbacks[:1]) == sorted([full.url, bare.url]) and picked.fallbacks[1:] == ["http://localhost:1"]
+        primary.stop()
+        assert api.run(deal, read=False, showWarning=False) == loadJson(os.path.join(test_folder, "benchmark", "us", "resp", "test01.out.json"))
+        assert api.url == fallback.url and fallback.log[-1][0] == "/runDeal"
+        req = api.build_run_deal_req("Single", deal)
+        assert isinstance(req, JsonBody) == ("chunkedUpload" in fallback.capabilities) == (fallback.chunked > 0)
+        assert ('"ColumnarAssets"' in str(req)) == ("columnarPool" in fallback.capabilities)
+        assert (api._encoding == "gzip") == ("gzip" in fallback.capabilities)
+
+
+def test_timeout_model():
+    m = TimeoutModel()
+    assert m.timeout("/runDeal", 1) == m.minTimeout == 10
+    assert m.timeout("/runDeal", 1, pricing=True) == m.pricingMinTimeout == 30
+    assert m.timeout("/runDeal", 1e12) == m.maxTimeout
+    assert m.timeout("/runDeal", 0, size=100*m.bandwidth) == m.overhead + 100
+    for (work, elapsed) in [(1e6, 2.0), (2e6, 3.0), (4e6, 5.0), (8e6, 9.0)]:
+        m.observe("/runDeal", work, elapsed)
+    assert m.predict("/runDeal", 16e6) == pytest.approx(17.0, rel=0.05)
+    assert m.predict("/runPool", 1e6) == m.priorRate * 1e6
+
+
+def test_pricing_timeout(engine, deal):
+    api = API(engine.url, lang='english')
+    timeouts = []
+    post = api._post
+    api._post = lambda *args: timeouts.append(args[3]) or post(*args)
+    api.run(deal, read=False, showWarning=False)
+    api.run(deal, runAssump=[("pricing", {"PVDate": "2021-08-22", "PVCurve": [["2021-01-01", 0.025]]})], read=False, showWarning=False)
+    assert timeouts == [api.timeoutModel.minTimeout, api.timeoutModel.pricingMinTimeout]
+
+
+def test_async_api(deal):
+    expected = loadJson(os.path.join(test_folder, "benchmark", "us", "resp", "test01.out.json"))
+    with StandInEngine(latency=0.05) as slow:
+        api = AsyncAPI(slow.url, lang='english', concurrency=2)
+
+        async def runAll(n):
+            rs = await asyncio.gather(*[api.run(deal, read=False, showWarning=False) for _ in range(n)])
+            return (rs, api._limiter())
+
+        (rs, first) = asyncio.run(runAll(6))
+        assert rs == [expected]*6
+        assert slow.peak == 2
+        (rs, second) = asyncio.run(runAll(2))
+        assert rs == [expected]*2 and first is not second
+        # semaphores of closed loops are not kept
+        del first, second
+        gc.collect()
+        assert len(api._limiters) <= 1
+        asyncio.run(runAll(3))
+        assert len(api._limiters) == 1
+
+        async def runBad():
+            return await asyncio.gather(api.run(deal, read=False, showWarning=False)
+                                        , api.run(deal, poolAssump={"base": None}, read=False)
+                                        , return_exceptions=True)
+
+        (ok, bad) = asyncio.run(runBad())
+        assert ok == expected and isinstance(bad, AbsboxError)
+        api.close()
+
+
+def test_retry_policy(deal):
+    expected = loadJson(os.path.join(test_folder, "benchmark", "us", "resp", "test01.out.json"))
+    runs = lambda e: sum(p == "/runDeal" for (p, _) in e.log)
+    with StandInEngine() as e:
+        api = API(e.url, lang='english', retry=RetryPolicy(retries=2, backoff=0.01, breakerThreshold=3, breakerCooldown=0.2))
+        e.faults.extend([503, 502])
+        assert api.run(deal, read=False, showWarning=False) == expected
+        assert runs(e) == 3
+        breaker = api._breaker(e.url+"/runDeal")
+        assert (breaker.state, breaker.failures) == ("closed", 0)
+        # not retried
+        e.faults.append(500)
+        with pytest.raises(EngineError):
+            api.run(deal, read=False, showWarning=False)
+        assert runs(e) == 4 and breaker.failures == 0
+        # retries exhausted, circuit opens on third failure
+        e.faults.extend([503]*3)
+        with pytest.raises(EngineError):
+            api.run(deal, read=False, showWarning=False)
+        assert runs(e) == 7 and breaker.state == "open"
+        with pytest.raises(AbsboxError):
+            api.run(deal, read=False, showWarning=False)
+        assert runs(e) == 7
+        # half open after cooldown, a single failure opens it again
+        time.sleep(0.2)
+        e.faults.append(503)
+        with pytest.raises(AbsboxError):
+            api.run(deal, read=False, showWarning=False)
+        assert runs(e) == 8 and breaker.state == "open"
+        time.sleep(0.2)
+        assert api.run(deal, read=False, showWarning=False) == expected
+        assert runs(e) == 9 and (breaker.state, breaker.failures) == ("closed", 0)
+
+
+def test_hedged_request(deal):
+    expected = loadJson(os.path.join(test_folder, "benchmark", "us", "resp", "test01.out.json"))
+    with StandInEngine() as primary, StandInEngine() as fallback:
+        api = API(primary.url, lang='english', fallbacks=[fallback.url], retry=RetryPolicy(hedgePercentile=0.5, hedgeMinSamples=3))
+        for _ in range(3):
+            api.run(deal, read=False, showWarning=False)
+        assert fallback.log == []
+        primary.latency = 2
+        started = time.perf_counter()
+        assert api.run(deal, read=False, showWarning=False) == expected
+        assert time.perf_counter() - started < primary.latency
+        assert [p for (p, _) in fallback.log] == ["/runDeal"]
+        assert api.url == primary.url
+
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_hedged_request_capabilities(deal, columnar):
+    with StandInEngine() as primary, StandInEngine(capabilities=[]) as plain:
+        api = API(primary.url, lang='english', fallbacks=[plain.url], columnar=columnar, compress='gzip', compressThreshold=0
+                  , retry=RetryPolicy(hedgePercentile=0.5, hedgeMinSamples=3))
+        for _ in range(3):
+            api.run(deal, read=False, showWarning=False)
+        primary.latency = 0.5
+        api.compressThreshold = 1e9
+        api.run(deal, read=False, showWarning=False)
+        # body in columns is never sent to a server which doesn't support it
+        assert [p for (p, _) in plain.log] == ([] if columnar else ["/runDeal"])
+        # neither is a gzip body
+        api.compressThreshold = 0
+        api.run(deal, read=False, showWarning=False)
+        assert len(plain.log) == (0 if columnar else 1)
+
+
+def test_profiler_phases():
+    class Worker:
+        profiler = Profiler()
+
+        @profiled
+        def call(self, build, transfer, barrier):
+            barrier.wait()
+            with phase("build"):
+                time.sleep(build)
+                with phase("transfer"):
+                    time.sleep(transfer)
+                    with phase("transfer"):
+                        time.sleep(transfer)
+            return self.nested()
+
+        @profiled
+        def nested(self):
+            with phase("read"):
+                time.sleep(0.05)
+            t = threading.Thread(target=carry(self.decode))
+            t.start()
+            t.join()
+
+        def decode(self):
+            with phase("decode"):
+                time.sleep(0.05)
+
+    w = Worker()
+    barrier = threading.Barrier(2)
+    threads = [threading.Thread(target=w.call, args=args) for args in [(0.05, 0.1, barrier), (0.3, 0, barrier)]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with phase("build"):
+        time.sleep(0.01)
+    rs = sorted(w.profiler.records, key=lambda r: r["transfer"])
+    assert [r["method"] for r in rs] == ["call", "call"]
+    for (r, (build, transfer)) in zip(rs, [(0.3, 0), (0.05, 0.2)]):
+        assert r["build"] == pytest.approx(build, abs=0.04)
+        assert r["transfer"] == pytest.approx(transfer, abs=0.04)
+        assert (r["read"], r["decode"]) == pytest.approx((0.05, 0.05), abs=0.04)
+        assert r["build"] + r["transfer"] + r["read"] + r["decode"] <= r["total"]
+
+
+def test_synthetic_engine(deal, tmp_path):
+    with StandInEngine(mode="replay", rows=24, benchmark=str(tmp_path)) as e:
+        r = API(e.url, lang='english').run(deal, read=True, showWarning=False)
+        assert len(r['pool']['flow']) == 24
+        assert r['bonds']['A1'].balance.iloc[-1] == 0
+        assert r['bonds']['A1'].principal.sum() == pytest.approx(r['pool']['flow'].Principal.sum())
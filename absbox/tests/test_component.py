@@ -0,0 +1,98 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from schema import SchemaError
+
+from absbox.local.component import mkAsset, mkPoolComp, mkPoolFromFrame, mkRateType, mkColumnarAssets, mkAssetUnion, mkWaterfall, mkWaterfalls, mkDs
+from absbox.validation import validating, getValidationMode
+from absbox.local.instrument import carry
+from absbox.local.standin import decodeColumnarAssets
+from absbox.local.util import inferPoolTypeFromAst
+from absbox.local.repline import mkRepLines
+
+
+def test_translate_pool_from_frame():
+    tape = pd.DataFrame({"originBalance": [2200.0, 1500.0, 1800.0], "originRate": [0.045, 0.05, 0.045], "originTerm": [30, 24, 30]
+                         , "freq": ["Monthly"]*3, "type": ["Level", "Even", "Level"], "originDate": ["2021-02-01"]*3
+                         , "currentBalance": [2200.0, 1400.0, 1700.0], "currentRate": [0.08, 0.05, 0.045], "remainTerm": [20, 10, 30]
+                         , "status": ["Current", "Current", ("Defaulted", "2021-05-01")], "prepayPenalty": [None, {"fixPct": [0.01]}, None]})
+    assets = [mkAsset(["Mortgage"
+                       , {"originBalance": r.originBalance, "originRate": ["fix", r.originRate], "originTerm": r.originTerm, "freq": r.freq
+                          , "type": r.type, "originDate": r.originDate, "prepayPenalty": r.prepayPenalty}
+                       , {"currentBalance": r.currentBalance, "currentRate": r.currentRate, "remainTerm": r.remainTerm, "status": r.status}])
+              for r in tape.itertuples()]
+    translated = mkPoolFromFrame(tape, "Mortgage")
+    assert json.dumps(translated) == json.dumps(assets)
+    assert [mkAsset(a) for a in translated] == translated
+    assert inferPoolTypeFromAst({"assets": translated}) == "MPool"
+
+
+@pytest.mark.parametrize("mode", ["fast", "trusted"])
+def test_translate_validation_mode(mode):
+    asset = ["Mortgage", {"originBalance": 2200, "originRate": ["fix", 0.045], "originTerm": 30, "freq": "Monthly", "type": "Level", "originDate": "2021-02-01"}
+             , {"currentBalance": 2200, "currentRate": 0.08, "remainTerm": 20, "status": "Current"}]
+    pool = {"assets": [asset]*3}
+    expected = mkPoolComp("2021-03-01", pool, False)
+    with validating(mode):
+        assert mkPoolComp("2021-03-01", pool, False) == expected
+        with pytest.raises(SchemaError):
+            mkPoolComp("2021-03-01", {"assets": [asset, ["Mortgage", asset[1] | {"originTerm": 30.5}, asset[2]]]}, False)
+        for bad in [{"originTerm": True}, {"originBalance": True}]:
+            with pytest.raises(SchemaError):
+                mkPoolComp("2021-03-01", {"assets": [asset, ["Mortgage", asset[1] | bad, asset[2]]]}, False)
+
+
+def test_validation_mode_scope():
+    with validating("trusted"):
+        assert mkRateType(["fix", "0.05"]) == {"tag": "Fix", "contents": ["DC_ACT_365F", "0.05"]}
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(getValidationMode).result() == "strict"
+            assert executor.submit(carry(getValidationMode)).result() == "trusted"
+    # translated without checks in trusted mode, not reused
+    with pytest.raises(SchemaError):
+        mkRateType(["fix", "0.05"])
+
+
+def test_translate_memo():
+    assert mkRateType({"fix": 0.05}) is mkRateType({"fix": 0.05})
+    assert json.dumps(mkRateType({"fix": 1})) != json.dumps(mkRateType({"fix": 1.0}))
+    assert mkRateType(["floater", 0.05, {"index": "SOFR1Y", "spread": 0.01, "reset": "YearEnd"}]) \
+        == mkRateType(["floater", 0.05, {"index": "SOFR1Y", "spread": 0.01, "reset": "YearEnd"}])
+
+    assert json.dumps(mkDs(("constant", 1))) != json.dumps(mkDs(("constant", 1.0)))
+    assert mkDs(["max", ["bondBalance"], ("poolBalance",)]) is mkDs(("max", ("bondBalance",), ("poolBalance",)))
+    assert mkDs(("max", ("bondBalance",), ("poolBalance",)))["contents"][0] is mkDs(("bondBalance",))
+    waterfall = {"amortizing": [["calcInt", "A1"], ["payInt", "acc01", ["A1"]], ["If", [("bondBalance", "A1"), ">", 0], ["payPrin", "acc01", ["A1"]]]]
+                 , "endOfCollection": [["calcAndPayFee", "acc01", ["trusteeFee"]]]}
+    translated = mkWaterfalls(waterfall)
+    assert translated == mkWaterfall({}, {k: [list(a) for a in v] for k, v in waterfall.items()})
+    assert mkWaterfalls({k: [list(a) for a in v] for k, v in waterfall.items()}) is translated
+    assert mkWaterfalls(waterfall | {"endOfCollection": [["calcAndPayFee", "acc01", ["serviceFee"]]]}) != translated
+
+
+def test_translate_columnar_assets():
+    mortgage = ["Mortgage", {"originBalance": 2200, "originRate": ["fix", 0.045], "originTerm": 30, "freq": "Monthly", "type": "Level", "originDate": "2021-02-01"}
+                , {"currentBalance": 2200, "currentRate": 0.08, "remainTerm": 20, "status": "Current"}]
+    loan = ["Loan", mortgage[1], mortgage[2] | {"currentBalance": 1800.5}]
+    assets = [mkAssetUnion(a) for a in [mortgage, loan, mortgage, loan]]
+    encoded = json.loads(json.dumps(mkColumnarAssets(assets)))
+    assert len(encoded["contents"]) == 2
+    assert decodeColumnarAssets(encoded) == json.loads(json.dumps(assets))
+
+
+def test_translate_rep_lines():
+    def mortgage(bal, rate, remainTerm, originDate="2021-02-01"):
+        return ["Mortgage", {"originBalance": bal, "originRate": ["fix", rate], "originTerm": 60, "freq": "Monthly", "type": "Level", "originDate": originDate}
+                , {"currentBalance": bal, "currentRate": rate, "remainTerm": remainTerm, "status": "Current"}]
+    lease = ["Lease", {"fixRental": 12.0, "originTerm": 96, "freq": ["DayOfMonth", 15], "originDate": "2022-01-05", "status": "Current", "remainTerm": 80}]
+    pool = {"assets": [mortgage(1000, 0.05, 50), mortgage(3000, 0.051, 54, "2021-04-01"), mortgage(2000, 0.08, 50), lease]}
+    r = mkRepLines(pool, rateStep=0.01)
+    assert len(r["assets"]) == 3
+    assert r["assets"][0] == ["Mortgage", {"originBalance": 4000, "originRate": ["fix", 0.05075], "originTerm": 60, "freq": "Monthly", "type": "Level"
+                                           , "originDate": "2021-03-17"}
+                              , {"currentBalance": 4000, "currentRate": 0.05075, "remainTerm": 53, "status": "Current"}]
+    assert r["assets"][1:] == pool["assets"][2:]
+    assert mkRepLines({"pool": pool}, rateStep=0.01) == {"pool": r}
+    assert [mkAsset(a) for a in r["assets"]]
@@ -1,5 +1,7 @@
-from schema import Schema,Regex,Or
+from schema import Schema,Regex,Or,SchemaError
 import re
+import functools, contextvars
+from contextlib import contextmanager
 
 from urllib.parse import urlparse
 
@@ -15,10 +17,65 @@ def isValidUrl(url: str) -> str | None:
 
 
 dateStr = Regex(r"^\d{4}-\d{2}-\d{2}$")
+datePattern = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+VALIDATION_MODES = ("strict", "fast", "trusted")
+_mode = contextvars.ContextVar("validationMode", default="strict")
+
+
+def setValidationMode(mode: str) -> None:
+    """ Set how fields are validated when translating deals/pools/assumptions, in current thread/context only
+
+    * strict: validate each field by `schema`, defaults
+    * fast: validate each field by precompiled checks, same rules and errors as `strict`
+    * trusted: skip checks of each field, only types of numbers/terms/dates of pool assets are checked
+
+    :param mode: 'strict', 'fast' or 'trusted'
+    :type mode: str
+    """
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"Invalid validation mode:{mode}, only support {VALIDATION_MODES}")
+    _mode.set(mode)
+
+
+def getValidationMode() -> str:
+    return _mode.get()
+
+
+@contextmanager
+def validating(mode: str):
+    """ Use validation `mode` within the block, e.g `with validating("trusted"): api.run(deal)` """
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"Invalid validation mode:{mode}, only support {VALIDATION_MODES}")
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+@functools.lru_cache(maxsize=64)
+def _listSchema(t) -> Schema:
+    return Schema([t])
+
+
+def _typeError(x, *ts):
+    return SchemaError(f"{x!r} should be instance of " + " or ".join(f"'{t.__name__}'" for t in ts))
 
 
 def vList(x, t, msg:str = None) -> list:
-    return Schema([t]).validate(x)
+    match _mode.get():
+        case "strict":
+            return Schema([t]).validate(x)
+        case "fast":
+            if isinstance(t, type) and isinstance(x, list):
+                isT = (lambda v: isinstance(v, t) and not isinstance(v, bool)) if t is not bool else (lambda v: isinstance(v, t))
+                if all(map(isT, x)):
+                    return x
+                raise _typeError(next(_ for _ in x if not isT(_)), t)
+            return _listSchema(t).validate(x)
+        case _:
+            return x
 
 
 def vDict(x, msg:str = None) -> dict:
@@ -26,27 +83,57 @@ def vDict(x, msg:str = None) -> dict:
 
 
 def vStr(x, msg:str = None) -> str:
-    return Schema(str).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(str).validate(x)
+    if mode == "fast" and not isinstance(x, str):
+        raise _typeError(x, str)
+    return x
 
 
 def vNum(x, msg:str = None) -> float:
-    return Schema(Or(float, int)).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(Or(float, int)).validate(x)
+    if mode == "fast" and (not isinstance(x, (float, int)) or isinstance(x, bool)):
+        raise _typeError(x, float, int)
+    return x
 
 
 def vFloat(x, msg:str = None) -> float:
-    return Schema(float).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(float).validate(x)
+    if mode == "fast" and not isinstance(x, float):
+        raise _typeError(x, float)
+    return x
 
 
 def vInt(x, msg:str = None) -> int:
-    return Schema(int).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(int).validate(x)
+    if mode == "fast" and (not isinstance(x, int) or isinstance(x, bool)):
+        raise _typeError(x, int)
+    return x
 
 
 def vBool(x, msg:str = None) -> bool:
-    return Schema(bool).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(bool).validate(x)
+    if mode == "fast" and not isinstance(x, bool):
+        raise _typeError(x, bool)
+    return x
 
 
 def vDate(x, msg:str = None) -> str:
-    return Schema(dateStr).validate(x)
+    mode = _mode.get()
+    if mode == "strict":
+        return Schema(dateStr).validate(x)
+    if mode == "fast" and not (isinstance(x, str) and datePattern.match(x)):
+        raise SchemaError(f"{x!r} does not match {datePattern.pattern!r}")
+    return x
 
 
 def vCurve(x, msg:str = None):
@@ -63,4 +150,34 @@ def validation(deal):
     if len(errors) > 0:
         return False, errors, warnings
     else:
-        return True, [], warnings
\ No newline at end of file
+        return True, [], warnings
+
+
+assetColumns = {"num": ("originBalance", "currentBalance", "currentRate", "放款金额", "当前余额", "当前利率")
+                , "int": ("originTerm", "remainTerm", "初始期限", "剩余期限")
+                , "date": ("originDate", "start", "dueDate", "放款日")}
+""" fields of pool assets checked by type in `trusted` mode """
+
+
+def vAssetColumns(assets: list) -> list:
+    """ check types of fields of pool assets, a set of types per field, used in `trusted` mode instead of checking each field of each asset by schema """
+    maps = [(i, m) for (i, ast) in enumerate(assets) if isinstance(ast, (list, tuple))
+                   for m in ast[1:] if isinstance(m, dict)]
+    checks = {"num": lambda v: isinstance(v, (float, int)) and not isinstance(v, bool)
+              , "int": lambda v: isinstance(v, int) and not isinstance(v, bool)
+              , "date": lambda v: isinstance(v, str) and datePattern.match(v) is not None}
+    for (kind, fields) in assetColumns.items():
+        for k in fields:
+            vs = [m[k] for (_, m) in maps if k in m]
+            if not vs:
+                continue
+            if kind == "date":
+                ok = all(map(checks[kind], set(vs) if all(isinstance(v, str) for v in vs) else vs))
+            else:
+                ok = set(map(type, vs)) <= ({float, int} if kind == "num" else {int})
+            if not ok:
+                bad = [i for (i, m) in maps if k in m and not checks[kind](m[k])]
+                if bad:
+                    raise SchemaError(f"Invalid value of {k} in assets at index {bad[:5]}:vAssetColumns")
+    return assets
+